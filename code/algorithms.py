@@ -1,8 +1,9 @@
 import networkx as nx
 import numpy as np
 import probability as prob
-from multiprocessing import Pool
 from collections import deque  # efficient queue implementation
+import heapq
+from scipy import sparse
 from copy import deepcopy
 import time
 
@@ -58,9 +59,13 @@ class Algorithm:
         self.k = k
         self.ic_trials = ic_trials
         self.evaluations = []
+        self.evaluation_ess = [] # effective sample sizes of importance-sampled evaluations
+        self.evaluation_unreliable = [] # whether an importance-sampled evaluation fell back or kept unresolved zeros
         self.use_cache = use_cache
         self.threads = threads
         self.precompute_time = 0
+        self.world_index = None # optional world_index.WorldIndex replacing the simulations of predict
+        self.evaluation_index = None # optional index evaluate scores on, sampled apart from world_index
 
         # initialize the seeds if needed
         if seeds == None:
@@ -135,28 +140,113 @@ class Algorithm:
         '''
         pass
 
+    def estimate(self, seeds):
+        '''
+        Access probabilities of every node for the given seeds,
+        read from the world index when one is set.
+        '''
+        if self.world_index is not None:
+            return self.world_index.estimate(seeds)
+
+        return prob.estimate(self.G, self.p, seeds, self.ic_trials, self.threads)
+
     # legacy code for a different parallelization startegy
     def eval_mt_helper(self, G, p, seeds, ic_trials):
         return prob.estimate_single_thread(G, p, seeds, ic_trials)
     
-    def evaluate(self):
+    def evaluate(self, checkpoints=None, incremental=False, world_seed=None, importance=False, importance_targets=8, importance_min_ess=10, importance_max_trials=None):
         '''
-        Evaluates the algorithm by running it
+        Evaluates the algorithm by running it.
+        Returns the minimum access probability after each prefix of the seeds,
+        or only after the prefix sizes listed in checkpoints (e.g. [1, 2, 5, 10]).
+        With incremental, all prefixes are scored against one fixed set of worlds
+        that grows seed by seed instead of simulating every prefix from scratch.
+        With an evaluation_index, every prefix is scored on its worlds. It must not
+        be the index the seeds were picked on, or they look better than they are.
+        With importance, the importance_targets lowest nodes of a plain estimate are
+        re-estimated by importance sampling, for tiny minimum probabilities at low p.
+        A target whose effective sample size (trials reaching it) stays below
+        importance_min_ess is retried with doubled trials up to importance_max_trials
+        (8 * ic_trials by default), then keeps its plain estimate. Zeros left
+        unrefined stay in the minimum. The smallest ESS goes to self.evaluation_ess,
+        and whether either fallback happened to self.evaluation_unreliable.
         '''
         # run the algorithm
 
         seeds = self.predict()
 
-        subsets = []
+        if checkpoints is None:
+            checkpoints = range(1, len(seeds) + 1)
+
+        checkpoints = sorted(set(checkpoints))
+
+        if incremental and self.evaluation_index is None:
+            worlds = prob.Worlds(self.G, self.p, self.ic_trials, world_seed, self.threads)
+            added = 0
+
+            for i in checkpoints:
+                # add the seeds up to the next checkpoint
+                worlds.add_seeds(seeds[added:i])
+                added = i
+
+                self.evaluations.append(np.min(worlds.estimate()))
+        elif importance:
+            for i in checkpoints:
+                probs = prob.estimate(self.G, self.p, seeds[:i], self.ic_trials, self.threads)
+
+                # the nodes the plain estimate puts lowest, ties (mostly zeros) broken
+                # by hop distance from the seeds, farthest first
+                hops = nx.multi_source_dijkstra_path_length(self.G, set(seeds[:i]))
+                far = np.array([-hops.get(v, np.inf) for v in range(len(probs))])
+                targets = np.lexsort((far, probs))[:importance_targets]
+
+                # tilt the cascades toward one target at a time,
+                # so that their paths don't share the likelihood ratio
+                refined = probs.copy()
+                ess = []
+                max_trials = importance_max_trials or 8 * self.ic_trials
+                unreliable = False
+
+                for t in targets:
+                    trials = self.ic_trials
+
+                    while True:
+                        tilted, t_ess = prob.estimate_importance(self.G, self.p, seeds[:i], [t], trials, threads=self.threads)
+
+                        if t_ess >= importance_min_ess or 2 * trials > max_trials:
+                            break
 
-        # create subsets of seeds to evaluate
-        for i in range(1, len(seeds) + 1):
-            # chose first i seeds
-            subsets.append(seeds[:i])
+                        trials *= 2
 
-        for i in range(len(subsets)):
-            result = prob.estimate(self.G, self.p, subsets[i], self.ic_trials)
-            self.evaluations.append(np.min(result))
+                    if t_ess >= importance_min_ess:
+                        refined[t] = tilted[t]
+                    else:
+                        # a handful of trials would set the estimate, keep the plain one
+                        print("[evaluate] node {}: ESS {:.1f} after {} trials, keeping the plain estimate".format(t, t_ess, trials))
+                        unreliable = True
+
+                    ess.append(t_ess)
+
+                # zeros that were not refined may be the minimum, so they stay in it
+                unresolved = probs == 0
+                unresolved[targets] = False
+
+                if np.any(unresolved):
+                    print("[evaluate] {} zero estimates not refined, consider more importance_targets".format(np.sum(unresolved)))
+                    unreliable = True
+
+                self.evaluations.append(np.min(refined))
+                self.evaluation_ess.append(np.min(ess))
+                self.evaluation_unreliable.append(unreliable)
+        elif self.evaluation_index is not None:
+            for i in checkpoints:
+                # chose first i seeds
+                result = self.evaluation_index.estimate(seeds[:i])
+                self.evaluations.append(np.min(result))
+        else:
+            # all prefixes go to the native library in one batch
+            subsets = [list(seeds[:i]) for i in checkpoints]
+            self.evaluations.extend(prob.estimate_many(self.G, self.p, subsets, self.ic_trials, self.threads, min_only=True))
 
         # find and return the minimum probability
         return self.evaluations
@@ -203,26 +293,87 @@ class Greedy(Algorithm):
     An approach where the next seed is chosen s.t. the lowest probability is maximized.
     '''
 
-    def __init__(self, G, p=0.5, k=100, seeds=None, ic_trials=1000, use_cache=False, threads=0):
+    def __init__(self, G, p=0.5, k=100, seeds=None, ic_trials=1000, use_cache=False, threads=0, lazy=False, bound_nodes=4, batch=64, shared_worlds=False):
         self.algo_name = 'greedy'
         self.cache_filename = "./cache/algo_cache/{}/{}_{}.txt".format(self.algo_name, G.name, p)
         super(Greedy, self).__init__(G, p, k, seeds, ic_trials, use_cache, threads)
 
+        # lazy: only score the candidates that can still beat the best one, see lazy_select
+        self.lazy = lazy
+        self.bound_nodes = bound_nodes
+        self.batch = batch
+        self.last_scores = {}
+
+        # shared_worlds: score all candidates of a round over the same sampled worlds,
+        # drawn from round_seed (one per round, so lazy batches are comparable)
+        self.shared_worlds = shared_worlds
+        self.round_seed = None
+
     def initialize_seeds(self):
         # Greedy algorithm does not need an initial seed
         self.seeds = []
 
-    def greedy_mt_helper(self, G, p, seeds, ic_trials):
+    def score_candidates(self, candidates):
+        '''
+        The minimum probability for the seeds plus each candidate.
+        '''
+        if self.shared_worlds:
+            # common random numbers: the same worlds for every call of the round, only each candidate's reach delta is simulated
+            return prob.compile_graph(self.G).greedy_scores(self.seeds, candidates, self.p, self.ic_trials, self.threads, self.round_seed)
+
+        # one batched native call scores every candidate,
+        # parallel over candidates inside the library
+        return prob.estimate_many(self.G, self.p, [self.seeds + [c] for c in candidates], self.ic_trials, self.threads, min_only=True)
+
+    def lazy_select(self, candidates):
         '''
-        Helper function for Multi-Threaded Greedy.
+        Picks the next seed without scoring every candidate.
+        Adding seeds never lowers the minimum probability, so a candidate's score
+        from an earlier round is a lower bound on its score now. For an upper bound,
+        take a few of the currently worst-off nodes w: the score of seeds + c is at
+        most P(w reached from seeds + c), and one reverse simulation gives that for
+        every c. Candidates are scored in batches, highest upper bound first, until
+        no remaining bound can beat the best score.
+        The bounds are estimates too, so this matches plain Greedy up to noise.
         '''
+        cg = prob.compile_graph(self.G)
+        probs = prob.estimate(self.G, self.p, self.seeds, self.ic_trials, self.threads)
 
-        probs = prob.estimate_single_thread(G, p, seeds, ic_trials)
+        # the worst-off nodes, shuffled first so ties (all zero for an empty seed set) are broken randomly
+        order = np.random.permutation(cg.n)
+        worst = order[np.argsort(probs[order], kind='stable')[:self.bound_nodes]]
 
-        # get the minimum probability
-        min_val = np.min(probs)
+        upper = np.ones(cg.n, dtype=np.float32)
+        for w in worst:
+            upper = np.minimum(upper, cg.estimate_reverse(self.seeds, w, self.p, self.ic_trials, self.threads))
 
-        return min_val
+        # the best earlier score is reachable without scoring anything
+        best, best_score = None, -1.0
+        for c in candidates:
+            if self.last_scores.get(c, -1.0) > best_score:
+                best, best_score = c, self.last_scores[c]
+
+        # candidates by upper bound, highest first
+        queue = [(-upper[c], c) for c in candidates]
+        heapq.heapify(queue)
+        scored = 0
+
+        while queue and -queue[0][0] > best_score:
+            batch = [heapq.heappop(queue)[1] for _ in range(min(self.batch, len(queue)))]
+
+            # one native call scores the whole batch
+            scores = self.score_candidates(batch)
+            scored += len(batch)
+
+            for c, score in zip(batch, scores):
+                self.last_scores[c] = score
+
+                if score > best_score:
+                    best, best_score = c, score
+
+        print("[greedy] lazy round scored {}/{} candidates".format(scored, len(candidates)))
+
+        return best
 
     def predict(self):
         if self.k > 0: # if we need to predict more seeds
@@ -233,13 +384,23 @@ class Greedy(Algorithm):
                 # get difference of nodes and seeds
                 candidates = list(set(self.G.nodes()) - set(self.seeds))
 
+                if self.shared_worlds:
+                    # every batch of this round is scored on the same worlds
+                    self.round_seed = int(np.random.randint(0, np.iinfo(np.int64).max, dtype=np.int64))
+
+                if self.lazy:
+                    self.seeds.append(self.lazy_select(candidates))
+
+                    # save partial cache
+                    if self.use_cache:
+                        self.save_cache()
+
+                    continue
+
                 # stores minimum probabilities for each candidate
                 next_min = np.zeros(len(candidates))
 
-                # multiprocessing
-                # I have found that multiprocessing subsets is faster
-                # than multiprocessing cascades
-                next_min = np.array(Pool().starmap(self.greedy_mt_helper, [(self.G, self.p, self.seeds + [c], self.ic_trials) for c in candidates]))
+                next_min = self.score_candidates(candidates)
 
                 # get the index of the candidate with the highest minimum probability
                 choice = np.argmax(next_min)
@@ -265,17 +426,51 @@ class Myopic(Algorithm):
     The initial seed is the node with the highest degree.
     '''
 
-    def __init__(self, G, p=0.5, k=100, seeds=None, ic_trials=1000, use_cache=False, threads=0):
+    def __init__(self, G, p=0.5, k=100, seeds=None, ic_trials=1000, use_cache=False, threads=0, adaptive=False, epsilon=0.1, delta=0.05, incremental=False, multi_fidelity=False, screen_trials=50, candidates=64):
         self.algo_name = 'myopic'
         self.cache_filename = "./cache/algo_cache/{}/{}_{}.txt".format(self.algo_name, G.name, p)
         super(Myopic, self).__init__(G, p, k, seeds, ic_trials, use_cache, threads)
 
+        # adaptive trial counts: stop each step once the argmin is the true one or within a
+        # factor 1 + epsilon of the true minimum (with probability 1 - delta), ic_trials is the cap
+        self.adaptive = adaptive
+        self.epsilon = epsilon
+        self.delta = delta
+        self.trials_used = []
+
+        # incremental: sample ic_trials worlds once and only expand each new seed into them
+        self.incremental = incremental
+
+        # multi-fidelity: screen every node with screen_trials, then race the lowest candidates
+        self.multi_fidelity = multi_fidelity
+        self.screen_trials = screen_trials
+        self.candidates = candidates
+
     def predict(self):
 
         if self.k > 0: # if we need to predict more seeds
+            worlds = None
+            if self.incremental and self.world_index is None:
+                worlds = prob.Worlds(self.G, self.p, self.ic_trials, threads=self.threads)
+                worlds.add_seeds(self.seeds)
+
             for _ in range(self.k):
+                if self.multi_fidelity and worlds is None and self.world_index is None:
+                    # only the argmin is needed, refine just the candidates for it
+                    choice, levels = prob.argmin_multi_fidelity(self.G, self.p, self.seeds, self.screen_trials, self.candidates, self.ic_trials, threads=self.threads)
+                    print('[myopic] multi-fidelity levels (trials, candidates): {}'.format(levels))
+                    self.seeds.append(list(self.G.nodes())[choice])
+                    continue
+
                 # get the probabilities for the current seed set
-                probs = prob.estimate(self.G, self.p, self.seeds, self.ic_trials, self.threads)
+                if worlds is not None:
+                    probs = worlds.estimate()
+                elif self.adaptive and self.world_index is None:
+                    probs, trials = prob.estimate_adaptive(self.G, self.p, self.seeds, self.epsilon, self.delta, target='argmin', max_trials=self.ic_trials, threads=self.threads)
+                    self.trials_used.append(trials)
+                    print('[myopic] adaptive estimate used {}/{} trials'.format(trials, self.ic_trials))
+                else:
+                    probs = self.estimate(self.seeds)
 
                 # get the index of the node with the minimum probability
                 # choice = np.argmin(probs) # old oneliner that chooses the first minimum
@@ -288,6 +483,9 @@ class Myopic(Algorithm):
                 # append a new seed
                 self.seeds.append(list(self.G.nodes())[choice])
 
+                if worlds is not None:
+                    worlds.add_seed(self.seeds[-1])
+
             # save full cache
             if self.use_cache:
                 # save the seeds to the file
@@ -309,7 +507,7 @@ class NaiveMyopic(Algorithm):
     def predict(self):
         if self.k > 0: # if we need to predict more seeds
             # get the probabilities for the current seed set
-            probs = prob.estimate(self.G, self.p, self.seeds, self.ic_trials, self.threads)
+            probs = self.estimate(self.seeds)
 
             # choose k nodes with the lowest probabilities
             # by default, sorts with quicksort (O(n log n))
@@ -465,162 +663,113 @@ class BFSMyopic(Algorithm):
         self.cache_filename = "./cache/algo_cache/{}/{}_{}.txt".format(self.algo_name, G.name, p)
         super(BFSMyopic, self).__init__(G, p, k, seeds, ic_trials, use_cache, threads)
 
-    class Node():
-        def __init__(self, id, p):
-            self.id = id
-            self.from_parent_prob = []
-            self.from_neighbor_prob = []
-            self.to_neighbor_prob = None
-            self.to_child_prob = None
-            self.children = []
-            self.p = p
-            self.activation_probs = [] # activation probabilities from all seeds
-            self.final_activation_prob = None
-
-        def compute_to_neighbor_prob(self):
-            # compute the probability of transmission to neighbors in the same layer relative to the seed
-            # this takes into account probabilities from parents only
-
-            # if the check fails, it's actually a seed node
-            if self.to_neighbor_prob is None:
-                 # probabilities for each event that it does not happen
-                probs_log = np.log1p(-np.exp(self.from_parent_prob))
-
-                # compute the log of the probability that none of the transmissions occur
-                prob_no_transmission_log = np.sum(probs_log)
-
-                # compute the log of the probability that at least one transmission occurs
-                prob_at_least_one_transmission_log = np.log1p(-np.exp(prob_no_transmission_log))
-
-                # set probability that at least one of the transmissions occurs
-                self.to_neighbor_prob = prob_at_least_one_transmission_log + np.log(self.p)
-
-        def compute_to_child_prob(self):
-            # compute the probability of transmission to children in the next layer relative to the seed
-            # this takes into account probabilities from parents and probabilities from neighbors
-
-            # if this check fails, it's actually a seed node
-            if self.to_child_prob is None:
-                probs_log = np.concatenate((self.from_parent_prob, self.from_neighbor_prob))
-
-                # compute the probability for events not to happen
-                probs_log = np.log1p(-np.exp(probs_log))
-
-                # compute the log of the probability that none of the transmissions occur
-                prob_no_transmission_log = np.sum(probs_log)
-
-                # compute the probability that at least one transmission occurs
-                prob_at_least_one_transmission_log = np.log1p(-np.exp(prob_no_transmission_log))
-
-                self.activation_probs.append(prob_at_least_one_transmission_log)
-                self.to_child_prob = prob_at_least_one_transmission_log + np.log(self.p)
-
-        def compute_activation_prob(self):
-            # computes the probability of activation for this node
-            # takes into account all seeds
-
-            if self.final_activation_prob !=0: # 0 because of log space
-                if np.any(np.array(self.activation_probs) > -1e-15):
-                    # if any of the activation probabilities is very close to zero,
-                    # this node is basically guaranteed to be activated
-                    # so we skip computations and assign a probability of 1
-                    # if we were to compute, np.log1p would throw a division by zero warning
-                    self.final_activation_prob = np.log(1)
-                else:
-                    # compute the probability for events not to happen
-                    probs_log = np.log1p(-np.exp(self.activation_probs))
+    @staticmethod
+    def bfs_levels(indptr, indices, source):
+        '''
+        BFS level of every node from source over CSR arrays, -1 if unreachable.
+        '''
+        level = np.full(len(indptr) - 1, -1)
+        level[source] = 0
+        frontier = np.array([source])
+        depth = 0
 
-                    # compute the log of the probability that none of the transmissions occur
-                    prob_no_transmission_log = np.sum(probs_log)
+        while len(frontier) > 0:
+            # all neighbours of the frontier
+            degree = indptr[frontier + 1] - indptr[frontier]
+            offsets = np.arange(degree.sum()) - np.repeat(np.cumsum(degree) - degree, degree)
+            nbrs = indices[np.repeat(indptr[frontier], degree) + offsets]
 
-                    # compute the log of the probability that at least one transmission occurs
-                    prob_at_least_one_transmission_log = np.log1p(-np.exp(prob_no_transmission_log))
+            frontier = np.unique(nbrs[level[nbrs] < 0])
+            depth += 1
+            level[frontier] = depth
 
-                    # set the final activation probability
-                    self.final_activation_prob = prob_at_least_one_transmission_log
+        return level
 
-        def reset(self):
-            self.from_parent_prob.clear()
-            self.from_neighbor_prob.clear()
-            self.to_child_prob = None
-            self.to_neighbor_prob = None
-            self.children.clear()
-            self.final_activation_prob = None
+    @staticmethod
+    def bfs_activation(indptr, indices, src, seed, p):
+        '''
+        One layered pass from seed over CSR arrays (src is the source node of every
+        edge). Returns the log activation probability of every node, 0 for the
+        seed and -inf for nodes the BFS does not reach.
+        '''
+        n = len(indptr) - 1
+        dst = indices
+        log_p = np.log(p)
+        level = BFSMyopic.bfs_levels(indptr, indices, seed)
+        max_level = level.max()
+
+        # log-probabilities of transmission to children and to same-layer neighbours
+        activation = np.full(n, -np.inf)
+        to_child = np.full(n, -np.inf)
+        to_neighbor = np.full(n, -np.inf)
+        activation[seed] = 0.0
+        to_child[seed] = log_p
+        to_neighbor[seed] = log_p
+
+        # edges from a parent into the next layer, and edges within a layer,
+        # both grouped by the layer of dst
+        reached = level[src] >= 0
+        parent_edges = np.where(reached & (level[dst] == level[src] + 1))[0]
+        parent_edges = parent_edges[np.argsort(level[dst[parent_edges]], kind='stable')]
+        parent_bounds = np.searchsorted(level[dst[parent_edges]], np.arange(max_level + 2))
+
+        layer_edges = np.where(reached & (level[dst] == level[src]))[0]
+        layer_edges = layer_edges[np.argsort(level[dst[layer_edges]], kind='stable')]
+        layer_bounds = np.searchsorted(level[dst[layer_edges]], np.arange(max_level + 2))
+
+        by_level = np.argsort(level, kind='stable')
+        level_bounds = np.searchsorted(level[by_level], np.arange(max_level + 2))
+        pos = np.zeros(n, dtype=np.int64) # position of a node within its layer
+
+        with np.errstate(divide='ignore'):
+            for l in range(1, max_level + 1):
+                layer = by_level[level_bounds[l]:level_bounds[l + 1]]
+                pos[layer] = np.arange(len(layer))
+
+                # log of the probability that no parent transmits
+                pe = parent_edges[parent_bounds[l]:parent_bounds[l + 1]]
+                parent_log = np.bincount(pos[dst[pe]], weights=np.log1p(-np.exp(to_child[src[pe]])), minlength=len(layer))
+
+                to_neighbor[layer] = np.log1p(-np.exp(parent_log)) + log_p
+
+                # log of the probability that no same-layer neighbour transmits
+                le = layer_edges[layer_bounds[l]:layer_bounds[l + 1]]
+                neighbor_log = np.bincount(pos[dst[le]], weights=np.log1p(-np.exp(to_neighbor[src[le]])), minlength=len(layer))
+
+                activation[layer] = np.log1p(-np.exp(parent_log + neighbor_log))
+                to_child[layer] = activation[layer] + log_p
+
+        return activation
 
     def predict(self):
+        nodes = list(self.G.nodes())
+        indptr, indices = prob.cached_csr(self.G)
+        n = len(nodes)
 
-        nodes_ds = [self.Node(id, self.p) for id in self.G.nodes()]
-
-        while self.k > 0:
-            cur_layer = set() # nodes in the current level
-            next_layer = set() # nodes in the next level
-            last_layer = set()
-
-            cur_layer.add(self.seeds[-1]) # add initial seed
-
-            nodes_ds[self.seeds[-1]].from_parent_prob.append(np.log(1))
-            nodes_ds[self.seeds[-1]].from_neighbor_prob.append(-np.inf) # log(0) is undefined
-            nodes_ds[self.seeds[-1]].to_child_prob = np.log(self.p)
-            nodes_ds[self.seeds[-1]].to_neighbor_prob = np.log(self.p)
-            nodes_ds[self.seeds[-1]].activation_probs = [np.log(1)]
-            nodes_ds[self.seeds[-1]].final_activation_prob = np.log(1)
-
-            while cur_layer: # this runs until there is nothing left to check in the graph
-                for node in cur_layer:
-
-                    # get neighbors of the node
-                    neighbors = self.G.neighbors(node)
-
-                    # compute the probability of transmission to neighbors in the same layer relative to the seed
-                    # this takes into account probabilities from parents only
-                    nodes_ds[node].compute_to_neighbor_prob()
-
-                    for nei in neighbors:
-                        # check if the neighbor is actually among the parents
-                        # of nodes in the current layer
-                        if nei not in last_layer:
-                            if nei in cur_layer:
-                                # this is a neighbor in the same level
-                                nodes_ds[nei].from_neighbor_prob.append(nodes_ds[node].to_neighbor_prob)
-                            else:
-                                # this is a child living in the next layer
-                                next_layer.add(nei)
-                                nodes_ds[node].children.append(nei) # we save the child's id for later
-
-                # current layer is done, from_neighbor_prob is now filled for all nodes in the current layer
-                for node in cur_layer:
-                    # compute to_child probs for next layer
-                    nodes_ds[node].compute_to_child_prob()
-
-                    # set from_parent_prob for all children
-                    for child in nodes_ds[node].children:
-                        nodes_ds[child].from_parent_prob.append(nodes_ds[node].to_child_prob)            
-
-                # we finished the current level
-                # move on to the next level
-                last_layer = cur_layer.copy()
-                cur_layer = next_layer.copy()
-                next_layer.clear()
-
-            # we finished the BFS
-            # compute the activation probability for each node
-            for node in nodes_ds:
-                node.compute_activation_prob()
+        # source node of every edge of the CSR arrays
+        src = np.repeat(np.arange(n), np.diff(indptr))
 
-            # sort nodes by activation probability
-            nodes_ds.sort(key=lambda x: x.final_activation_prob, reverse=False)
+        # running per-node log-survival over all BFS passes, log prod(1 - activation),
+        # and whether some pass activated the node (almost) surely
+        survival = np.zeros(n)
+        certain = np.zeros(n, dtype=bool)
+
+        with np.errstate(divide='ignore'):
+            while self.k > 0:
+                activation = self.bfs_activation(indptr, indices, src, self.seeds[-1], self.p)
 
-            # get the single lowest k node
-            self.seeds.append(nodes_ds[0].id)
+                # if any of the activation probabilities is very close to zero,
+                # this node is basically guaranteed to be activated
+                certain |= activation > -1e-15
+                survival += np.log1p(-np.exp(activation))
 
-            # restore original sort order
-            nodes_ds.sort(key=lambda x: x.id, reverse=False)
+                # activation probability of every node over all seeds, in log space
+                final = np.where(certain, 0.0, np.log1p(-np.exp(survival)))
 
-            self.k -= 1
+                # the lowest one, first node on ties
+                self.seeds.append(nodes[np.argmin(final)])
 
-            # zero out the data structure except for activation_probs
-            for node in nodes_ds:
-                node.reset()
+                self.k -= 1
 
         # save full cache
         if self.use_cache:
@@ -640,155 +789,121 @@ class NaiveBFSMyopic(Algorithm):
         self.cache_filename = "./cache/algo_cache/{}/{}_{}.txt".format(self.algo_name, G.name, p)
         super(NaiveBFSMyopic, self).__init__(G, p, k, seeds, ic_trials, use_cache, threads)
 
-    class Node():
-        def __init__(self, id, p):
-            self.id = id
-            self.from_parent_prob = []
-            self.from_neighbor_prob = []
-            self.to_neighbor_prob = None
-            self.to_child_prob = None
-            self.children = []
-            self.neighbor_targets = []
-            self.p = p
-            self.activation_prob = None
-
-        def compute_to_neighbor_prob(self):
-            # compute the probability of transmission to neighbors in the same layer relative to the seed
-            # this takes into account probabilities from parents only
-
-            # if the check fails, it's actually a seed node
-            if self.to_neighbor_prob is None:
-                 # probabilities for each event that it does not happen
-                probs_log = np.log1p(-np.exp(self.from_parent_prob))
-
-                # compute the log of the probability that none of the transmissions occur
-                prob_no_transmission_log = np.sum(probs_log)
-
-                # compute the log of the probability that at least one transmission occurs
-                prob_at_least_one_transmission_log = np.log1p(-np.exp(prob_no_transmission_log))
-
-                # set probability that at least one of the transmissions occurs
-                self.to_neighbor_prob = prob_at_least_one_transmission_log + np.log(self.p)
-
-        def compute_to_child_prob(self):
-            # compute the probability of transmission to children in the next layer relative to the seed
-            # this takes into account probabilities from parents and probabilities from neighbors
-
-            # if this check fails, it's actually a seed node
-            if self.to_child_prob is None:
-                probs_log = np.concatenate((self.from_parent_prob, self.from_neighbor_prob))
-
-                # compute the probability for events not to happen
-                probs_log = np.log1p(-np.exp(probs_log))
-
-                # compute the log of the probability that none of the transmissions occur
-                prob_no_transmission_log = np.sum(probs_log)
-
-                # compute the probability that at least one transmission occurs
-                prob_at_least_one_transmission_log = np.log1p(-np.exp(prob_no_transmission_log))
-
-                self.activation_prob = prob_at_least_one_transmission_log
-                self.to_child_prob = prob_at_least_one_transmission_log + np.log(self.p)
-
- 
     def predict(self):
 
         if self.k > 0:
-            depth = 1
-
-            nodes_ds = [self.Node(id, self.p) for id in self.G.nodes()]
-
-            cur_layer = set() # nodes in the current level
-
-            next_layer = set() # nodes in the next level
+            nodes = list(self.G.nodes())
+            indptr, indices = prob.cached_csr(self.G)
+            n = len(nodes)
 
-            last_layer = set()
+            # a single layered pass from the last seed, nodes it never reaches have probability 0
+            src = np.repeat(np.arange(n), np.diff(indptr))
+            activation = BFSMyopic.bfs_activation(indptr, indices, src, self.seeds[-1], self.p)
 
-            cur_layer.add(self.seeds[-1]) # add initial seed
+            # get the lowest k nodes without sorting all of them;
+            # ties at the k-th value go to the first nodes, as with a stable sort
+            k = min(self.k, n)
+            kth = np.partition(activation, k - 1)[k - 1]
+            lowest = np.concatenate((np.where(activation < kth)[0], np.where(activation == kth)[0]))[:k]
 
-            nodes_ds[self.seeds[-1]].from_parent_prob.append(np.log(1))
-            nodes_ds[self.seeds[-1]].from_neighbor_prob.append(-np.inf)
-            nodes_ds[self.seeds[-1]].to_child_prob = np.log(self.p)
-            nodes_ds[self.seeds[-1]].to_neighbor_prob = np.log(self.p)
-            nodes_ds[self.seeds[-1]].activation_prob = np.log(1)
+            # sort nodes by activation probability
+            lowest = lowest[np.argsort(activation[lowest], kind='stable')]
 
-            while cur_layer: # this runs until there is nothing left to check in the graph
-                for node in cur_layer:
+            self.seeds.extend([nodes[i] for i in lowest])
 
-                    # get neighbors of the node
-                    neighbors = self.G.neighbors(node)
+            # save full cache
+            if self.use_cache:
+                # save the seeds to the file
+                self.save_cache()
 
-                    # compute the probability of transmission to neighbors in the same layer relative to the seed
-                    # this takes into account probabilities from parents only
-                    nodes_ds[node].compute_to_neighbor_prob()
+        return self.seeds
 
-                    for nei in neighbors:
-                        # check if the neighbor is actually among the parents
-                        # of nodes in the current layer
-                        if nei not in last_layer:
-                            if nei in cur_layer:
-                                # this is a neighbor in the same level
-                                nodes_ds[nei].from_neighbor_prob.append(nodes_ds[node].to_neighbor_prob)
-                                #nodes_ds[node].neighbor_targets.append(nei)
-                            else:
-                                # this is a child living in the next layer
-                                next_layer.add(nei)
-                                nodes_ds[node].children.append(nei) # we save the child's id for later
+class PPRMyopic(Algorithm):
+    def __init__(self, G, p=0.5, k=100, seeds=None, ic_trials=1000, use_cache=False, threads=0, linear=False, tol=1e-12, max_iter=1000):
+        self.algo_name = 'ppr_myopic'
+        self.cache_filename = "./cache/algo_cache/{}/{}_{}.txt".format(self.algo_name, G.name, p)
+        super(PPRMyopic, self).__init__(G, p, k, seeds, ic_trials, use_cache, threads)
 
-                    
-                # current layer is done, from_neighbor_prob is now filled for all nodes in the current layer
-                for node in cur_layer:
-                    # compute to_child probs for next layer
-                    nodes_ds[node].compute_to_child_prob()
+        # linear: PPR is linear in the personalization vector, so only the new seed's
+        # single-source PPR is computed each step and added to a running sum.
+        # tol is the relative change of every entry at which the iteration stops
+        self.linear = linear
+        self.tol = tol
+        self.max_iter = max_iter
 
-                    # set from_parent_prob for all children
-                    for child in nodes_ds[node].children:
-                        nodes_ds[child].from_parent_prob.append(nodes_ds[node].to_child_prob)            
+    @staticmethod
+    def transition_matrix(G, nodes):
+        '''
+        Transposed random walk matrix of G as scipy CSR, rows of dangling nodes are zero.
+        Same weights as nx.pagerank.
+        '''
+        A = nx.to_scipy_sparse_array(G, nodelist=nodes, weight='weight', dtype=float)
+        out = np.asarray(A.sum(axis=1)).ravel()
 
+        with np.errstate(divide='ignore'):
+            inv_out = np.where(out > 0, 1.0 / out, 0.0)
 
-                # we finished the current level
-                # move on to the next level
-                last_layer = cur_layer.copy()
-                cur_layer = next_layer.copy()
-                next_layer.clear()
+        return sparse.csr_array((sparse.diags_array(inv_out) @ A).T)
 
-                depth += 1
+    def single_source_ppr(self, transition, source, alpha=0.3):
+        '''
+        PPR of one source by power iteration, warm-started at (1 - alpha) e_source,
+        the first term of the series. The walk is not restarted at dangling nodes
+        (nx.pagerank restarts it at the personalization), so the vector sums to at most 1.
+        The iteration runs until every entry has converged relative to its own value,
+        so nodes far from the source get their tiny but nonzero PPR instead of 0,
+        and at least until it has reached every node the source can reach.
+        '''
+        n = transition.shape[0]
+        restart = np.zeros(n)
+        restart[source] = 1 - alpha
+        x = restart.copy()
 
-            # for node in nodes_ds:
-            #     print(node.id, node.activation_prob, node.from_parent_prob, node.from_neighbor_prob, node.to_neighbor_prob, node.to_child_prob)
+        for _ in range(self.max_iter):
+            x_last = x
+            x = alpha * (transition @ x_last) + restart
 
+            # all terms of the series are nonnegative, so small entries are accurate
+            # too; an entry that is still 0 did not change and is unreachable
+            if np.all(np.abs(x - x_last) <= self.tol * x):
+                return x
 
-            # sort nodes by activation probability
-            nodes_ds.sort(key=lambda x: x.activation_prob, reverse=False)
+        raise nx.PowerIterationFailedConvergence(self.max_iter)
 
-            # get the lowest k nodes
-            self.seeds.extend([node.id for node in nodes_ds[:self.k]])
+    def predict_linear(self):
+        nodes = list(self.G.nodes())
+        index = {node: i for i, node in enumerate(nodes)}
+        transition = self.transition_matrix(self.G, nodes)
 
-            # save full cache
-            if self.use_cache:
-                # save the seeds to the file
-                self.save_cache()
+        # the seed set's PPR is proportional to the sum of its single-source vectors
+        # (exactly, without the dangling restart, which only rescales the sum)
+        ppr_sum = np.zeros(len(nodes))
+        for seed in dict.fromkeys(self.seeds):
+            ppr_sum += self.single_source_ppr(transition, index[seed])
 
-        return self.seeds
+        for _ in range(self.k):
+            # pick the lowest node, first node on ties
+            seed = nodes[np.argmin(ppr_sum)]
+            self.seeds.append(seed)
 
-class PPRMyopic(Algorithm):
-    def __init__(self, G, p=0.5, k=100, seeds=None, ic_trials=1000, use_cache=False, threads=0):
-        self.algo_name = 'ppr_myopic'
-        self.cache_filename = "./cache/algo_cache/{}/{}_{}.txt".format(self.algo_name, G.name, p)
-        super(PPRMyopic, self).__init__(G, p, k, seeds, ic_trials, use_cache, threads)
+            ppr_sum += self.single_source_ppr(transition, index[seed])
 
     def predict(self):
         # initial attempt
         if self.k > 0:
-            for _ in range(self.k):
-                # compute personalized page rank with machine precision tolerance
-                ppr = nx.pagerank(self.G, alpha=0.3, tol=1e-16, personalization={node: 1 for node in self.seeds}, max_iter=1000)
+            if self.linear:
+                self.predict_linear()
+
+            else:
+                for _ in range(self.k):
+                    # compute personalized page rank with machine precision tolerance
+                    ppr = nx.pagerank(self.G, alpha=0.3, tol=1e-16, personalization={node: 1 for node in self.seeds}, max_iter=1000)
 
-                # sort nodes by activation probability
-                sorted_ppr = sorted(ppr.items(), key=lambda x: x[1], reverse=False)
+                    # sort nodes by activation probability
+                    sorted_ppr = sorted(ppr.items(), key=lambda x: x[1], reverse=False)
 
-                # pick the lowest node
-                self.seeds.append(sorted_ppr[0][0])
+                    # pick the lowest node
+                    self.seeds.append(sorted_ppr[0][0])
 
             # save full cache
             if self.use_cache:
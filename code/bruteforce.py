@@ -2,10 +2,17 @@ import itertools
 import algorithms as alg
 import numpy as np
 import probability as prob
+import world_index as wi
 
-def run_bruteforce(G, p, k):
+def run_bruteforce(G, p, k, use_world_index=False):
     # bruteforces the optimal seed set for a given graph and p
     # this is slow, don't run for anything other than the SMALL synthetic graphs
+    # with use_world_index, every seed set is scored against the same sampled worlds
+
+    world_index = wi.get_world_index(G, p) if use_world_index else None
+
+    # myopic picks its seeds on other worlds than the ones they are scored on
+    prediction_index = wi.get_world_index(G, p, cache_dir='./cache/world_index/prediction/') if use_world_index else None
 
     # get every possible seed set
     all_seed_sets = list(itertools.combinations(range(G.number_of_nodes()), k))
@@ -15,6 +22,8 @@ def run_bruteforce(G, p, k):
 
     for i in range(20):
         myopic = alg.Myopic(G, k=k, p=p)
+        myopic.world_index = prediction_index
+        myopic.evaluation_index = world_index
         myopic_eval.append(myopic.evaluate())
 
     # average last column
@@ -25,22 +34,26 @@ def run_bruteforce(G, p, k):
     print("Myopic score to beat: ", to_beat)
     print("Seed sets to consider: ", len(all_seed_sets))
 
-    # run bruteforce
-    for i, seeds in enumerate(all_seed_sets):
+    # run bruteforce, seed sets are estimated in batches of this size
+    batch = 1000
+
+    for start in range(0, len(all_seed_sets), batch):
         # print progress
-        if i % 1000 == 0:
-            print(f"{i}/{len(all_seed_sets)}")
-
-        # get IC evaluation
-        ic_eval = prob.estimate(G, p, seeds, 1000)
-        
-        # get the min probability
-        eval = np.min(ic_eval)
-
-        # if IC is better than myopic, print it
-        if eval > to_beat:
-            print("Found better seed set!")
-            print(f"Seeds: {seeds}")
-            print(f"IC eval: {eval}")
-
-    #print(len(all_seed_sets))
+        print(f"{start}/{len(all_seed_sets)}")
+
+        seed_sets = all_seed_sets[start:start + batch]
+
+        # get the min probability of each set
+        if world_index is not None:
+            evals = [np.min(world_index.estimate(seeds)) for seeds in seed_sets]
+        else:
+            evals = prob.estimate_many(G, p, seed_sets, 1000, min_only=True)
+
+        for seeds, eval in zip(seed_sets, evals):
+            # if IC is better than myopic, print it
+            if eval > to_beat:
+                print("Found better seed set!")
+                print(f"Seeds: {seeds}")
+                print(f"IC eval: {eval}")
+
+    #print(len(all_seed_sets))
\ No newline at end of file
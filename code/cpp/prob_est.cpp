@@ -4,7 +4,13 @@
 
 #include <queue> // for queue
 
-#include <random>
+#include <vector>
+
+#include <cstdint>
+
+#include <climits>
+
+#include <cmath>
 
 #include <omp.h>
 
@@ -14,24 +20,115 @@ using namespace std;
 
 // using cpp and openmp
 
+static inline uint64_t splitmix64(uint64_t &x)
+{
+    // splitmix64 step, used to expand seeds into generator states
+    uint64_t z = (x += 0x9E3779B97F4A7C15ULL);
+    z = (z ^ (z >> 30)) * 0xBF58476D1CE4E5B9ULL;
+    z = (z ^ (z >> 27)) * 0x94D049BB133111EBULL;
+    return z ^ (z >> 31);
+}
+
+static inline uint64_t mix64(uint64_t a, uint64_t b)
+{
+    // counter-based hash of a (key, counter) pair
+    uint64_t x = a ^ (b * 0xD1B54A32D192ED03ULL);
+    return splitmix64(x);
+}
+
+static inline float edge_threshold(uint64_t world_key, int u, int v, bool symmetric)
+{
+    // uniform threshold in [0, 1) of the edge u -> v in a fixed live-edge world
+    // the edge is live at p iff its threshold is below p
+    // for undirected graphs both directions share one threshold
+    uint64_t a = (uint32_t)u, b = (uint32_t)v;
+
+    if (symmetric && a > b)
+    {
+        uint64_t t = a;
+        a = b;
+        b = t;
+    }
+
+    return (mix64(world_key, (a << 32) | b) >> 40) * (1.0f / 16777216.0f);
+}
+
 class RandomGenerator
 {
+    // xoshiro128+ with a small float buffer
+    // every (seed, stream) pair maps to its own state through a counter-based hash,
+    // so trial i of a call with a given seed always sees the same numbers
 public:
-    RandomGenerator() : gen(static_cast<unsigned>(time(0))), dist(0.0f, 1.0f) {}
+    static const int BUFFER = 64;
+
+    RandomGenerator(uint64_t seed, uint64_t stream) : pos(BUFFER)
+    {
+        uint64_t x = mix64(seed, stream);
+        uint64_t a = splitmix64(x);
+        uint64_t b = splitmix64(x);
+
+        s[0] = (uint32_t)a;
+        s[1] = (uint32_t)(a >> 32);
+        s[2] = (uint32_t)b;
+        s[3] = (uint32_t)(b >> 32);
+
+        // the all-zero state is the only invalid one
+        if ((s[0] | s[1] | s[2] | s[3]) == 0)
+            s[0] = 1;
+    }
 
     float get()
     {
-        return dist(gen);
+        if (pos == BUFFER)
+        {
+            fill(buf, BUFFER);
+            pos = 0;
+        }
+
+        return buf[pos++];
+    }
+
+    uint32_t next()
+    {
+        uint32_t result = s[0] + s[3];
+        uint32_t t = s[1] << 9;
+
+        s[2] ^= s[0];
+        s[3] ^= s[1];
+        s[1] ^= s[2];
+        s[0] ^= s[3];
+        s[2] ^= t;
+        s[3] = (s[3] << 11) | (s[3] >> 21);
+
+        return result;
+    }
+
+    int skip(double log_q)
+    {
+        // number of failed edges before the next successful one,
+        // geometric with success probability p where log_q = log(1 - p)
+        double gap = log(1.0 - get()) / log_q;
+
+        return gap < INT_MAX / 2 ? (int)gap : INT_MAX / 2;
+    }
+
+    uint64_t next64()
+    {
+        uint64_t hi = next();
+        return (hi << 32) | next();
     }
 
-    void seed(int seed)
+    void fill(float *out, int count)
     {
-        gen.seed(time(0) + seed);
+        // uniform floats in [0, 1) from the top 24 bits
+        for (int i = 0; i < count; i++)
+            out[i] = (next() >> 8) * (1.0f / 16777216.0f);
     }
 
 private:
-    std::mt19937 gen;
-    std::uniform_real_distribution<float> dist;
+    uint32_t s[4];
+    float buf[BUFFER];
+    int pos;
 };
 
 void ic(RandomGenerator *gen, bool **adj, int *ss, int *activated_, int n_, int len_ss, float p)
@@ -66,58 +163,1711 @@ void ic(RandomGenerator *gen, bool **adj, int *ss, int *activated_, int n_, int
     }
 }
 
-extern "C"
+// per-thread scratch space that is reused across trials
+// a node counts as activated in the current trial iff stamp[node] == epoch,
+// so bumping the epoch "clears" the activations without touching the array
+struct Workspace
 {
-    void estimate(int threads, float p_, int n_, int iters_, int len_ss_, int *adj1d_, int *ss_, float *result_)
+    int n;
+    unsigned int epoch;
+    unsigned int *stamp;
+    int *queue;  // every node enters the queue at most once per trial
+    int *counts; // number of trials in which each node was activated
+
+    Workspace(int n_) : n(n_), epoch(0)
     {
-        int **activated_global = new int *[iters_];
-        bool **adj = new bool *[n_];
+        stamp = new unsigned int[n_]();
+        queue = new int[n_];
+        counts = new int[n_]();
+    }
 
-        // convert flat adj1d to adj
-        for (int i = 0; i < n_; i++)
+    ~Workspace()
+    {
+        delete[] stamp;
+        delete[] queue;
+        delete[] counts;
+    }
+
+    void next_trial()
+    {
+        epoch++;
+
+        if (epoch == 0)
         {
-            adj[i] = new bool[n_];
-            for (int j = 0; j < n_; j++)
-                adj[i][j] = adj1d_[i * n_ + j];
+            // the counter wrapped around, old stamps could collide with new epochs
+            for (int i = 0; i < n; i++)
+                stamp[i] = 0;
+            epoch = 1;
         }
+    }
+};
 
-#pragma omp parallel for num_threads(threads)
-        for (int i = 0; i < iters_; i++)
+// how edge activations are drawn in ic_csr
+// BERNOULLI rolls one number per neighbour
+// GEOMETRIC draws the gap to the next successful edge, so the number of rolls
+// scales with the number of activations instead of the degree (good for low p)
+enum Sampling
+{
+    SAMPLING_BERNOULLI = 0,
+    SAMPLING_GEOMETRIC = 1
+};
+
+int ic_csr(RandomGenerator *gen, int *indptr, int *indices, int *ss, int len_ss, float p, int sampling, Workspace *ws)
+{
+    // same as ic(), but only walks the actual neighbours of each node
+    // indptr/indices hold the graph in CSR form: the neighbours of node u
+    // are indices[indptr[u]], ..., indices[indptr[u + 1] - 1]
+    // activated nodes are added to ws->counts
+    ws->next_trial();
+
+    unsigned int epoch = ws->epoch;
+    unsigned int *stamp = ws->stamp;
+    int *q = ws->queue;
+    int head = 0, tail = 0;
+
+    // initialize queue to the seed set
+    for (int i = 0; i < len_ss; i++)
+        if (stamp[ss[i]] != epoch)
+        {
+            stamp[ss[i]] = epoch;
+            q[tail++] = ss[i];
+        }
+
+    if (sampling == SAMPLING_GEOMETRIC)
+    {
+        double log_q = log(1.0 - (double)p);
+
+        // with p <= 0 no edge ever fires, only the seeds are active
+        while (p > 0 && head < tail)
         {
-            // make a local random number generator and seed it
-            RandomGenerator gen;
-            gen.seed(i);
+            int node = q[head++];
+            long long end = indptr[node + 1];
 
-            // initialize activations matrix
-            int *activated = new int[n_];
+            // walk only the edges that succeed, whether or not the neighbour is already active
+            // (the draw for an already active neighbour wouldn't change anything)
+            for (long long e = indptr[node] + (long long)gen->skip(log_q); e < end; e += 1 + (long long)gen->skip(log_q))
+            {
+                int nei = indices[e];
 
-            for (int j = 0; j < n_; j++)
-                activated[j] = 0;
+                if (stamp[nei] != epoch)
+                {
+                    stamp[nei] = epoch;
+                    q[tail++] = nei;
+                }
+            }
+        }
+    }
+    else
+    {
+        while (head < tail)
+        {
+            int node = q[head++];
 
-            // run ic
-            ic(&gen, adj, ss_, activated, n_, len_ss_, p_);
+            for (int e = indptr[node]; e < indptr[node + 1]; e++)
+            {
+                int nei = indices[e];
 
-            // add to global activations matrix
-            activated_global[i] = activated;
+                if (stamp[nei] != epoch && gen->get() < p)
+                {
+                    // the edge is activated
+                    stamp[nei] = epoch;
+                    q[tail++] = nei;
+                }
+            }
         }
+    }
 
-        // compute results and save to result_
-        for (int i = 0; i < iters_; i++)
-            for (int j = 0; j < n_; j++)
-                result_[j] += activated_global[i][j];
+    // the queue now holds exactly the activated nodes
+    for (int i = 0; i < tail; i++)
+        ws->counts[q[i]]++;
 
-        for (int i = 0; i < n_; i++)
-            result_[i] /= iters_;
+    return tail;
+}
 
-        // free memory
-        for (int i = 0; i < n_; i++)
-            delete[] adj[i];
+// what a trial adds up per node
+// INDICATOR counts 1 for every activated node
+// RAO_BLACKWELL counts 1 - (1 - p)^a for a non-seed node with a active in-neighbours
+// in the final state, the chance that one of their edges into it fires
+// this is exact when the node stays inactive (the final state is then the cascade
+// of the graph without it), but when it is active, the nodes it activated itself
+// also count, so the estimator is biased upwards
+enum Estimator
+{
+    ESTIMATOR_INDICATOR = 0,
+    ESTIMATOR_RAO_BLACKWELL = 1
+};
 
-        delete[] adj;
+// per-thread scratch space for the Rao-Blackwellized estimator
+struct RBWorkspace
+{
+    int *active_nbrs; // active in-neighbours of each node in the current trial
+    int *touched;     // nodes with active_nbrs > 0, for resetting
+    double *sums;
 
-        for (int i = 0; i < iters_; i++)
-            delete[] activated_global[i];
+    RBWorkspace(int n_)
+    {
+        active_nbrs = new int[n_]();
+        touched = new int[n_];
+        sums = new double[n_]();
+    }
 
-        delete[] activated_global;
+    ~RBWorkspace()
+    {
+        delete[] active_nbrs;
+        delete[] touched;
+        delete[] sums;
+    }
+};
+
+void rao_blackwell_add(int *indptr, int *indices, int *active, int n_active, unsigned char *is_seed, double *q_pow, RBWorkspace *rb)
+{
+    // adds one trial, given its activated nodes, to rb->sums
+    // q_pow[a] is (1 - p)^a
+    int n_touched = 0;
+
+    for (int i = 0; i < n_active; i++)
+    {
+        int u = active[i];
+
+        for (int e = indptr[u]; e < indptr[u + 1]; e++)
+            if (rb->active_nbrs[indices[e]]++ == 0)
+                rb->touched[n_touched++] = indices[e];
+    }
+
+    for (int i = 0; i < n_touched; i++)
+    {
+        int v = rb->touched[i];
+
+        if (!is_seed[v])
+            rb->sums[v] += 1.0 - q_pow[rb->active_nbrs[v]];
+
+        rb->active_nbrs[v] = 0;
+    }
+}
+
+// bit-parallel engine: bit w of a word belongs to world (trial) w of a block of 64
+// edge activations are drawn for all 64 worlds at once as a random mask
+
+// p is rounded to this many binary digits for the masks (error below 1e-5)
+const int P_BITS = 16;
+
+static inline uint64_t bernoulli_mask(RandomGenerator *gen, uint32_t p_fixed)
+{
+    // 64 independent bits that are set with probability p_fixed / 2^P_BITS each
+    // walks the binary digits of p from the least significant one:
+    // a 1 digit ORs in a fresh random word, a 0 digit ANDs one in
+    if (p_fixed == 0)
+        return 0;
+
+    if (p_fixed >= (1u << P_BITS))
+        return ~0ULL;
+
+    uint64_t m = 0;
+
+    for (int i = __builtin_ctz(p_fixed); i < P_BITS; i++)
+    {
+        uint64_t r = gen->next64();
+        m = ((p_fixed >> i) & 1) ? (m | r) : (m & r);
+    }
+
+    return m;
+}
+
+struct BitWorkspace
+{
+    int n;
+    uint64_t *active;   // worlds in which each node is active
+    uint64_t *frontier; // worlds in which each node got activated in the last level
+    uint64_t *next;     // same for the level being built
+    int *frontier_list;
+    int *next_list;
+    int *touched; // nodes active in at least one world, for resetting
+    int *counts;
+
+    BitWorkspace(int n_) : n(n_)
+    {
+        active = new uint64_t[n_]();
+        frontier = new uint64_t[n_]();
+        next = new uint64_t[n_]();
+        frontier_list = new int[n_];
+        next_list = new int[n_];
+        touched = new int[n_];
+        counts = new int[n_]();
+    }
+
+    ~BitWorkspace()
+    {
+        delete[] active;
+        delete[] frontier;
+        delete[] next;
+        delete[] frontier_list;
+        delete[] next_list;
+        delete[] touched;
+        delete[] counts;
+    }
+};
+
+void ic_bitwise(RandomGenerator *gen, int *indptr, int *indices, int *ss, int len_ss, uint32_t p_fixed, uint64_t worlds, BitWorkspace *ws)
+{
+    // runs the cascade in every world set in the worlds mask at once, one BFS level at a time
+    uint64_t *active = ws->active;
+    uint64_t *frontier = ws->frontier;
+    uint64_t *next = ws->next;
+    int len_frontier = 0, len_touched = 0;
+
+    // number of 32 bit draws a full mask costs
+    int mask_cost = p_fixed == 0 || p_fixed >= (1u << P_BITS) ? 0 : 2 * (P_BITS - __builtin_ctz(p_fixed));
+
+    for (int i = 0; i < len_ss; i++)
+        if (!active[ss[i]])
+        {
+            active[ss[i]] = worlds;
+            frontier[ss[i]] = worlds;
+            ws->frontier_list[len_frontier++] = ss[i];
+            ws->touched[len_touched++] = ss[i];
+        }
+
+    while (len_frontier > 0)
+    {
+        int len_next = 0;
+
+        for (int i = 0; i < len_frontier; i++)
+        {
+            int node = ws->frontier_list[i];
+            uint64_t from = frontier[node];
+
+            frontier[node] = 0;
+
+            for (int e = indptr[node]; e < indptr[node + 1]; e++)
+            {
+                int nei = indices[e];
+
+                // worlds where this edge is tried at all
+                uint64_t tried = from & ~active[nei];
+
+                if (!tried)
+                    continue;
+
+                uint64_t fired = 0;
+
+                if (__builtin_popcountll(tried) < mask_cost)
+                {
+                    // only a few worlds left, rolling them one by one is cheaper than a full mask
+                    for (uint64_t bits = tried; bits; bits &= bits - 1)
+                        if ((gen->next() >> (32 - P_BITS)) < p_fixed)
+                            fired |= bits & (~bits + 1);
+                }
+                else
+                    fired = tried & bernoulli_mask(gen, p_fixed);
+
+                if (fired)
+                {
+                    if (!active[nei])
+                        ws->touched[len_touched++] = nei;
+
+                    if (!next[nei])
+                        ws->next_list[len_next++] = nei;
+
+                    active[nei] |= fired;
+                    next[nei] |= fired;
+                }
+            }
+        }
+
+        // the new level becomes the frontier
+        for (int i = 0; i < len_next; i++)
+        {
+            int node = ws->next_list[i];
+            frontier[node] = next[node];
+            next[node] = 0;
+        }
+
+        int *tmp = ws->frontier_list;
+        ws->frontier_list = ws->next_list;
+        ws->next_list = tmp;
+        len_frontier = len_next;
+    }
+
+    // popcounts give the number of worlds each node was active in
+    for (int i = 0; i < len_touched; i++)
+    {
+        int node = ws->touched[i];
+        ws->counts[node] += __builtin_popcountll(active[node]);
+        active[node] = 0;
+    }
+}
+
+// a graph kept alive on the C++ side between estimate calls
+struct Graph
+{
+    int n;
+    int *indptr;
+    int *indices;
+    bool directed;
+    int *rindptr; // incoming edges in CSR form, the same arrays as indptr/indices if undirected
+    int *rindices;
+};
+
+bool ic_reverse(RandomGenerator *gen, int *rindptr, int *rindices, int target, unsigned char *is_seed, float p, Workspace *ws)
+{
+    // one trial of "is target reached by the seeds", found by walking the live
+    // incoming edges back from target until a seed turns up
+    // every edge is rolled at most once, so this is a sample of the same
+    // live-edge world distribution as ic_csr
+    if (is_seed[target])
+        return true;
+
+    ws->next_trial();
+
+    unsigned int epoch = ws->epoch;
+    unsigned int *stamp = ws->stamp;
+    int *q = ws->queue;
+    int head = 0, tail = 0;
+
+    stamp[target] = epoch;
+    q[tail++] = target;
+
+    while (head < tail)
+    {
+        int node = q[head++];
+
+        for (int e = rindptr[node]; e < rindptr[node + 1]; e++)
+        {
+            int nei = rindices[e];
+
+            if (stamp[nei] != epoch && gen->get() < p)
+            {
+                if (is_seed[nei])
+                    return true;
+
+                stamp[nei] = epoch;
+                q[tail++] = nei;
+            }
+        }
+    }
+
+    return false;
+}
+
+static int find_root(int *parent, int x)
+{
+    // union-find lookup with path halving
+    while (parent[x] != x)
+    {
+        parent[x] = parent[parent[x]];
+        x = parent[x];
+    }
+
+    return x;
+}
+
+void label_world(Graph *g, uint64_t world_key, float p, int *parent, int *relabel, int *labels)
+{
+    // labels the connected components of one live-edge world (bond percolation) with 0, 1, 2, ...
+    int n = g->n;
+
+    for (int i = 0; i < n; i++)
+        parent[i] = i;
+
+    for (int u = 0; u < n; u++)
+        for (int e = g->indptr[u]; e < g->indptr[u + 1]; e++)
+        {
+            int v = g->indices[e];
+
+            // every undirected edge is stored twice, look at it once
+            if (u < v && edge_threshold(world_key, u, v, true) < p)
+            {
+                int ru = find_root(parent, u);
+                int rv = find_root(parent, v);
+
+                if (ru != rv)
+                    parent[ru] = rv;
+            }
+        }
+
+    int next_label = 0;
+
+    for (int i = 0; i < n; i++)
+        relabel[i] = -1;
+
+    for (int i = 0; i < n; i++)
+    {
+        int r = find_root(parent, i);
+
+        if (relabel[r] < 0)
+            relabel[r] = next_label++;
+
+        labels[i] = relabel[r];
+    }
+}
+
+// a fixed sample of live-edge worlds that seeds can be added to one at a time
+// adding a seed only expands into the nodes it newly reaches in each world,
+// so building up a k-seed set costs about as much as one full simulation
+struct Worlds
+{
+    Graph *g;
+    float p;
+    int count;
+    uint64_t seed;
+    int words;         // 64 bit words per world in reached
+    uint64_t *reached; // count x words bits, world-major
+    int *counts;       // number of worlds each node is reached in
+};
+
+static inline bool test_bit(uint64_t *bits, int i)
+{
+    return (bits[i >> 6] >> (i & 63)) & 1;
+}
+
+static inline void set_bit(uint64_t *bits, int i)
+{
+    bits[i >> 6] |= 1ULL << (i & 63);
+}
+
+int expand_world(Graph *g, uint64_t world_key, float p, int source, uint64_t *reached, int *queue)
+{
+    // BFS over the live edges of one world from source into nodes not reached yet
+    // marks them in reached, leaves them in queue and returns how many there are
+    if (test_bit(reached, source))
+        return 0;
+
+    bool symmetric = !g->directed;
+    int head = 0, tail = 0;
+
+    set_bit(reached, source);
+    queue[tail++] = source;
+
+    while (head < tail)
+    {
+        int node = queue[head++];
+
+        for (int e = g->indptr[node]; e < g->indptr[node + 1]; e++)
+        {
+            int nei = g->indices[e];
+
+            if (!test_bit(reached, nei) && edge_threshold(world_key, node, nei, symmetric) < p)
+            {
+                set_bit(reached, nei);
+                queue[tail++] = nei;
+            }
+        }
+    }
+
+    return tail;
+}
+
+void hop_distances(int *indptr, int *indices, int n, int *sources, int n_sources, int *dist, int *queue)
+{
+    // BFS hop counts from the nearest source, INT_MAX where no source reaches
+    int head = 0, tail = 0;
+
+    for (int i = 0; i < n; i++)
+        dist[i] = INT_MAX;
+
+    for (int s = 0; s < n_sources; s++)
+        if (dist[sources[s]] != 0)
+        {
+            dist[sources[s]] = 0;
+            queue[tail++] = sources[s];
+        }
+
+    while (head < tail)
+    {
+        int node = queue[head++];
+
+        for (int e = indptr[node]; e < indptr[node + 1]; e++)
+            if (dist[indices[e]] == INT_MAX)
+            {
+                dist[indices[e]] = dist[node] + 1;
+                queue[tail++] = indices[e];
+            }
     }
-}
\ No newline at end of file
+}
+
+// single cascades are spread over all threads on graphs with at least this many
+// nodes when there are fewer than FRONTIER_MAX_TRIALS trials
+// the choice never depends on the thread count, so a seed gives the same
+// estimates on every host (the two paths draw their edge coins differently)
+const int FRONTIER_MIN_NODES = 100000;
+const int FRONTIER_MAX_TRIALS = 8;
+
+static inline bool use_frontier(int n, int iters, int estimator)
+{
+    return estimator == ESTIMATOR_INDICATOR && n >= FRONTIER_MIN_NODES && iters < FRONTIER_MAX_TRIALS;
+}
+
+void estimate_frontier_parallel(int nthreads, float p, int n, int iters, int len_ss, int *indptr, int *indices, int *ss, uint64_t seed, float *result)
+{
+    // for few trials on a large graph: every cascade is spread over all threads,
+    // one BFS level at a time
+    // threads claim newly activated nodes with an atomic compare-and-swap and
+    // collect them in their own buffers, which are then joined into the next frontier
+    // edge coins come from edge_threshold, so the outcome doesn't depend on which
+    // thread rolls which edge
+    unsigned char *claimed = new unsigned char[n]();
+    int *frontier = new int[n];
+    int *next = new int[n];
+    int *offsets = new int[nthreads + 1]();
+    int *counts = new int[n]();
+
+    for (int r = 0; r < iters; r++)
+    {
+        uint64_t world_key = mix64(seed, r);
+        int size = 0;
+
+        for (int i = 0; i < len_ss; i++)
+            if (!claimed[ss[i]])
+            {
+                claimed[ss[i]] = 1;
+                frontier[size++] = ss[i];
+            }
+
+#pragma omp parallel num_threads(nthreads)
+        {
+            int tid = omp_get_thread_num();
+            int used = omp_get_num_threads();
+            int *local = new int[n];
+
+            while (size > 0)
+            {
+                int local_size = 0;
+
+#pragma omp for schedule(dynamic, 64)
+                for (int i = 0; i < size; i++)
+                {
+                    int node = frontier[i];
+
+                    for (int e = indptr[node]; e < indptr[node + 1]; e++)
+                    {
+                        int nei = indices[e];
+
+                        if (!claimed[nei] && edge_threshold(world_key, node, nei, false) < p && __sync_bool_compare_and_swap(&claimed[nei], 0, 1))
+                            local[local_size++] = nei;
+                    }
+                }
+
+                offsets[tid + 1] = local_size;
+
+#pragma omp barrier
+#pragma omp single
+                {
+                    for (int t = 0; t < used; t++)
+                        offsets[t + 1] += offsets[t];
+                }
+
+                for (int i = 0; i < local_size; i++)
+                    next[offsets[tid] + i] = local[i];
+
+#pragma omp barrier
+#pragma omp single
+                {
+                    int *t = frontier;
+                    frontier = next;
+                    next = t;
+                    size = offsets[used];
+                }
+            }
+
+            delete[] local;
+
+            // every claimed node was activated in this trial
+#pragma omp for
+            for (int j = 0; j < n; j++)
+            {
+                counts[j] += claimed[j];
+                claimed[j] = 0;
+            }
+        }
+    }
+
+    for (int j = 0; j < n; j++)
+        result[j] = (float)counts[j] / iters;
+
+    delete[] claimed;
+    delete[] frontier;
+    delete[] next;
+    delete[] offsets;
+    delete[] counts;
+}
+
+extern "C"
+{
+    void estimate(int threads, float p_, int n_, int iters_, int len_ss_, int *adj1d_, int *ss_, uint64_t seed_, float *result_)
+    {
+        int **activated_global = new int *[iters_];
+        bool **adj = new bool *[n_];
+
+        // convert flat adj1d to adj
+        for (int i = 0; i < n_; i++)
+        {
+            adj[i] = new bool[n_];
+            for (int j = 0; j < n_; j++)
+                adj[i][j] = adj1d_[i * n_ + j];
+        }
+
+#pragma omp parallel for num_threads(threads)
+        for (int i = 0; i < iters_; i++)
+        {
+            // each trial gets its own stream of the seeded generator
+            RandomGenerator gen(seed_, i);
+
+            // initialize activations matrix
+            int *activated = new int[n_];
+
+            for (int j = 0; j < n_; j++)
+                activated[j] = 0;
+
+            // run ic
+            ic(&gen, adj, ss_, activated, n_, len_ss_, p_);
+
+            // add to global activations matrix
+            activated_global[i] = activated;
+        }
+
+        // compute results and save to result_
+        for (int i = 0; i < iters_; i++)
+            for (int j = 0; j < n_; j++)
+                result_[j] += activated_global[i][j];
+
+        for (int i = 0; i < n_; i++)
+            result_[i] /= iters_;
+
+        // free memory
+        for (int i = 0; i < n_; i++)
+            delete[] adj[i];
+
+        delete[] adj;
+
+        for (int i = 0; i < iters_; i++)
+            delete[] activated_global[i];
+
+        delete[] activated_global;
+    }
+
+    void estimate_csr(int threads, float p_, int n_, int iters_, int len_ss_, int *indptr_, int *indices_, int *ss_, uint64_t seed_, int sampling_, int estimator_, float *result_)
+    {
+        // CSR version of estimate, O(n + m) memory for the graph itself
+        // each thread accumulates activation counts in its own workspace,
+        // so memory does not grow with the number of trials
+        int nthreads = threads > 0 ? threads : omp_get_max_threads();
+        bool rao_blackwell = estimator_ == ESTIMATOR_RAO_BLACKWELL;
+
+        if (use_frontier(n_, iters_, estimator_))
+        {
+            // too few trials to go around, parallelise inside each cascade instead
+            estimate_frontier_parallel(nthreads, p_, n_, iters_, len_ss_, indptr_, indices_, ss_, seed_, result_);
+            return;
+        }
+
+        Workspace **workspaces = new Workspace *[nthreads]();
+        RBWorkspace **rb_workspaces = new RBWorkspace *[nthreads]();
+        int used_threads = 1;
+
+        // seed flags and powers of 1 - p for the Rao-Blackwellized estimator
+        unsigned char *is_seed = NULL;
+        double *q_pow = NULL;
+
+        if (rao_blackwell)
+        {
+            is_seed = new unsigned char[n_]();
+            q_pow = new double[n_ + 1];
+
+            for (int i = 0; i < len_ss_; i++)
+                is_seed[ss_[i]] = 1;
+
+            q_pow[0] = 1.0;
+            for (int a = 1; a <= n_; a++)
+                q_pow[a] = q_pow[a - 1] * (1.0 - (double)p_);
+        }
+
+#pragma omp parallel num_threads(nthreads)
+        {
+            Workspace *ws = new Workspace(n_);
+            RBWorkspace *rb = rao_blackwell ? new RBWorkspace(n_) : NULL;
+            workspaces[omp_get_thread_num()] = ws;
+            rb_workspaces[omp_get_thread_num()] = rb;
+
+#pragma omp single
+            used_threads = omp_get_num_threads();
+
+            // cascade lengths vary a lot between trials, hence dynamic scheduling
+#pragma omp for schedule(dynamic, 4)
+            for (int i = 0; i < iters_; i++)
+            {
+                // each trial gets its own stream of the seeded generator
+                RandomGenerator gen(seed_, i);
+
+                // run ic
+                int n_active = ic_csr(&gen, indptr_, indices_, ss_, len_ss_, p_, sampling_, ws);
+
+                if (rao_blackwell)
+                    rao_blackwell_add(indptr_, indices_, ws->queue, n_active, is_seed, q_pow, rb);
+            }
+        }
+
+        // merge per-thread counts, parallel over nodes
+#pragma omp parallel for num_threads(nthreads)
+        for (int j = 0; j < n_; j++)
+        {
+            if (rao_blackwell && !is_seed[j])
+            {
+                double total = 0;
+
+                for (int t = 0; t < used_threads; t++)
+                    total += rb_workspaces[t]->sums[j];
+
+                result_[j] = (float)(total / iters_);
+                continue;
+            }
+
+            int total = 0;
+
+            for (int t = 0; t < used_threads; t++)
+                total += workspaces[t]->counts[j];
+
+            result_[j] = (float)total / iters_;
+        }
+
+        // free memory
+        for (int t = 0; t < used_threads; t++)
+        {
+            delete workspaces[t];
+            delete rb_workspaces[t];
+        }
+
+        delete[] workspaces;
+        delete[] rb_workspaces;
+        delete[] is_seed;
+        delete[] q_pow;
+    }
+
+    void estimate_csr_bitwise(int threads, float p_, int n_, int iters_, int len_ss_, int *indptr_, int *indices_, int *ss_, uint64_t seed_, float *result_)
+    {
+        // same as estimate_csr, but simulates 64 trials per machine word
+        int nthreads = threads > 0 ? threads : omp_get_max_threads();
+        BitWorkspace **workspaces = new BitWorkspace *[nthreads]();
+        int used_threads = 1;
+        int blocks = (iters_ + 63) / 64;
+        uint32_t p_fixed = (uint32_t)lround((double)p_ * (1u << P_BITS));
+
+#pragma omp parallel num_threads(nthreads)
+        {
+            BitWorkspace *ws = new BitWorkspace(n_);
+            workspaces[omp_get_thread_num()] = ws;
+
+#pragma omp single
+            used_threads = omp_get_num_threads();
+
+#pragma omp for schedule(dynamic, 1)
+            for (int b = 0; b < blocks; b++)
+            {
+                // each block of 64 trials gets its own stream of the seeded generator
+                RandomGenerator gen(seed_, b);
+
+                // the last block may be partial
+                int worlds = iters_ - b * 64 < 64 ? iters_ - b * 64 : 64;
+                uint64_t mask = worlds == 64 ? ~0ULL : ((1ULL << worlds) - 1);
+
+                ic_bitwise(&gen, indptr_, indices_, ss_, len_ss_, p_fixed, mask, ws);
+            }
+        }
+
+        // merge per-thread counts, parallel over nodes
+#pragma omp parallel for num_threads(nthreads)
+        for (int j = 0; j < n_; j++)
+        {
+            int total = 0;
+
+            for (int t = 0; t < used_threads; t++)
+                total += workspaces[t]->counts[j];
+
+            result_[j] = (float)total / iters_;
+        }
+
+        // free memory
+        for (int t = 0; t < used_threads; t++)
+            delete workspaces[t];
+
+        delete[] workspaces;
+    }
+
+    Graph *graph_create(int n_, int *indptr_, int *indices_, int directed_)
+    {
+        // copies the CSR arrays so the python side doesn't have to keep them alive
+        Graph *g = new Graph;
+
+        g->n = n_;
+        g->directed = directed_ != 0;
+        g->indptr = new int[n_ + 1];
+        g->indices = new int[indptr_[n_]];
+
+        for (int i = 0; i <= n_; i++)
+            g->indptr[i] = indptr_[i];
+
+        for (int e = 0; e < indptr_[n_]; e++)
+            g->indices[e] = indices_[e];
+
+        if (!g->directed)
+        {
+            g->rindptr = g->indptr;
+            g->rindices = g->indices;
+            return g;
+        }
+
+        // transpose for walking incoming edges
+        int m = indptr_[n_];
+        g->rindptr = new int[n_ + 1]();
+        g->rindices = new int[m];
+
+        for (int e = 0; e < m; e++)
+            g->rindptr[indices_[e] + 1]++;
+
+        for (int i = 0; i < n_; i++)
+            g->rindptr[i + 1] += g->rindptr[i];
+
+        int *fill = new int[n_];
+
+        for (int i = 0; i < n_; i++)
+            fill[i] = g->rindptr[i];
+
+        for (int u = 0; u < n_; u++)
+            for (int e = indptr_[u]; e < indptr_[u + 1]; e++)
+                g->rindices[fill[indices_[e]]++] = u;
+
+        delete[] fill;
+
+        return g;
+    }
+
+    void graph_free(Graph *g)
+    {
+        if (g->directed)
+        {
+            delete[] g->rindptr;
+            delete[] g->rindices;
+        }
+
+        delete[] g->indptr;
+        delete[] g->indices;
+        delete g;
+    }
+
+    void graph_estimate(Graph *g, int threads, float p_, int iters_, int len_ss_, int *ss_, uint64_t seed_, int sampling_, int engine_, int estimator_, float *result_)
+    {
+        // engine_: 0 runs trials one by one, 1 runs them 64 at a time
+        // estimator_ (see Estimator) only applies to the scalar engine
+        if (engine_ == 1)
+            estimate_csr_bitwise(threads, p_, g->n, iters_, len_ss_, g->indptr, g->indices, ss_, seed_, result_);
+        else
+            estimate_csr(threads, p_, g->n, iters_, len_ss_, g->indptr, g->indices, ss_, seed_, sampling_, estimator_, result_);
+    }
+
+    void graph_estimate_many(Graph *g, int threads, float p_, int iters_, int n_sets_, int *offsets_, int *seed_sets_, uint64_t seed_, int sampling_, int min_only_, float *result_)
+    {
+        // estimates several seed sets in one call
+        // set i is seed_sets_[offsets_[i]], ..., seed_sets_[offsets_[i + 1] - 1]
+        // result_ is n_sets_ x n, or just the per-set minimum with min_only_
+        int nthreads = threads > 0 ? threads : omp_get_max_threads();
+        int n = g->n;
+
+        if (n_sets_ < nthreads || use_frontier(n, iters_, ESTIMATOR_INDICATOR))
+        {
+            // too few sets to keep every thread busy, parallelise the trials of each set instead
+            // (or each cascade, see use_frontier), estimate_csr draws the same trials as the loop below
+            float *row = new float[n];
+
+            for (int s = 0; s < n_sets_; s++)
+            {
+                estimate_csr(threads, p_, n, iters_, offsets_[s + 1] - offsets_[s], g->indptr, g->indices, seed_sets_ + offsets_[s], mix64(seed_, s), sampling_, ESTIMATOR_INDICATOR, row);
+
+                if (min_only_)
+                {
+                    float min_val = row[0];
+
+                    for (int j = 1; j < n; j++)
+                        min_val = row[j] < min_val ? row[j] : min_val;
+
+                    result_[s] = min_val;
+                }
+                else
+                    for (int j = 0; j < n; j++)
+                        result_[(long long)s * n + j] = row[j];
+            }
+
+            delete[] row;
+            return;
+        }
+
+#pragma omp parallel num_threads(nthreads)
+        {
+            Workspace *ws = new Workspace(n);
+
+            // every thread runs all trials of one set at a time
+#pragma omp for schedule(dynamic, 1)
+            for (int s = 0; s < n_sets_; s++)
+            {
+                for (int j = 0; j < n; j++)
+                    ws->counts[j] = 0;
+
+                for (int i = 0; i < iters_; i++)
+                {
+                    RandomGenerator gen(mix64(seed_, s), i);
+                    ic_csr(&gen, g->indptr, g->indices, seed_sets_ + offsets_[s], offsets_[s + 1] - offsets_[s], p_, sampling_, ws);
+                }
+
+                if (min_only_)
+                {
+                    int min_count = ws->counts[0];
+
+                    for (int j = 1; j < n; j++)
+                        min_count = ws->counts[j] < min_count ? ws->counts[j] : min_count;
+
+                    result_[s] = (float)min_count / iters_;
+                }
+                else
+                    for (int j = 0; j < n; j++)
+                        result_[(long long)s * n + j] = (float)ws->counts[j] / iters_;
+            }
+
+            delete ws;
+        }
+    }
+
+    void graph_estimate_targets(Graph *g, int threads, float p_, int iters_, int len_ss_, int *ss_, int n_targets_, int *targets_, uint64_t seed_, float *result_)
+    {
+        // access probabilities of just the target nodes, iters_ reverse trials each
+        // result_[t] belongs to targets_[t]
+        // cheaper than a full estimate when there are few targets with small reverse reach
+        int nthreads = threads > 0 ? threads : omp_get_max_threads();
+        int n = g->n;
+        int blocks = (iters_ + 63) / 64;
+        int *hits = new int[n_targets_]();
+        unsigned char *is_seed = new unsigned char[n]();
+
+        for (int i = 0; i < len_ss_; i++)
+            is_seed[ss_[i]] = 1;
+
+#pragma omp parallel num_threads(nthreads)
+        {
+            Workspace *ws = new Workspace(n);
+
+            // work items are blocks of 64 trials of one target, so a handful of targets still fills every thread
+#pragma omp for schedule(dynamic, 1)
+            for (long long item = 0; item < (long long)n_targets_ * blocks; item++)
+            {
+                int t = (int)(item / blocks);
+                int b = (int)(item % blocks);
+                int end = (b + 1) * 64 < iters_ ? (b + 1) * 64 : iters_;
+                int found = 0;
+
+                // each target gets its own seeded stream per block
+                RandomGenerator gen(mix64(seed_, targets_[t]), b);
+
+                for (int i = b * 64; i < end; i++)
+                    found += ic_reverse(&gen, g->rindptr, g->rindices, targets_[t], is_seed, p_, ws);
+
+#pragma omp atomic
+                hits[t] += found;
+            }
+
+            delete ws;
+        }
+
+        for (int t = 0; t < n_targets_; t++)
+            result_[t] = (float)hits[t] / iters_;
+
+        delete[] hits;
+        delete[] is_seed;
+    }
+
+    void graph_estimate_reverse(Graph *g, int threads, float p_, int iters_, int len_ss_, int *ss_, int target_, uint64_t seed_, float *result_)
+    {
+        // result_[c] is the probability that target_ is reached from the seeds plus node c, for every c
+        // in each trial the whole reverse reach of target_ is explored: the target is reached
+        // by the seeds plus c iff the seeds or c are in it
+        int nthreads = threads > 0 ? threads : omp_get_max_threads();
+        int n = g->n;
+        int used_threads = 1;
+        int by_seeds = 0;
+        Workspace **workspaces = new Workspace *[nthreads]();
+        unsigned char *is_seed = new unsigned char[n]();
+
+        for (int i = 0; i < len_ss_; i++)
+            is_seed[ss_[i]] = 1;
+
+#pragma omp parallel num_threads(nthreads)
+        {
+            Workspace *ws = new Workspace(n);
+            workspaces[omp_get_thread_num()] = ws;
+
+#pragma omp single
+            used_threads = omp_get_num_threads();
+
+#pragma omp for schedule(dynamic, 16) reduction(+ : by_seeds)
+            for (int i = 0; i < iters_; i++)
+            {
+                RandomGenerator gen(seed_, i);
+
+                ws->next_trial();
+
+                unsigned int epoch = ws->epoch;
+                int *q = ws->queue;
+                int head = 0, tail = 0;
+                bool reached = false;
+
+                ws->stamp[target_] = epoch;
+                q[tail++] = target_;
+
+                while (head < tail)
+                {
+                    int node = q[head++];
+                    reached = reached || is_seed[node];
+
+                    for (int e = g->rindptr[node]; e < g->rindptr[node + 1]; e++)
+                    {
+                        int nei = g->rindices[e];
+
+                        if (ws->stamp[nei] != epoch && gen.get() < p_)
+                        {
+                            ws->stamp[nei] = epoch;
+                            q[tail++] = nei;
+                        }
+                    }
+                }
+
+                // reached by the seeds alone counts for every c, otherwise only for the c in the reverse reach
+                if (reached)
+                    by_seeds++;
+                else
+                    for (int j = 0; j < tail; j++)
+                        ws->counts[q[j]]++;
+            }
+        }
+
+#pragma omp parallel for num_threads(nthreads)
+        for (int j = 0; j < n; j++)
+        {
+            int total = by_seeds;
+
+            for (int t = 0; t < used_threads; t++)
+                total += workspaces[t]->counts[j];
+
+            result_[j] = (float)total / iters_;
+        }
+
+        for (int t = 0; t < used_threads; t++)
+            delete workspaces[t];
+
+        delete[] workspaces;
+        delete[] is_seed;
+    }
+
+    void graph_estimate_importance(Graph *g, int threads, float p_, float *q_, int iters_, int len_ss_, int *ss_, int n_targets_, int *targets_, uint64_t seed_, float *result_, double *weights_, double *layers_)
+    {
+        // importance sampling toward the targets: an edge that leads one hop closer to
+        // the nearest target fires with probability q_[l] instead of p_, where l is the
+        // hop distance of its source to the targets (q_ holds one value per node), and
+        // every trial is weighted by the likelihood ratio of the tilted edges it rolled
+        // (edges into already active nodes are never rolled, under either measure)
+        // result_[v] is the weighted fraction of trials that reach v, unbiased for every v
+        // weights_ receives the sum of the weights and the sum of their squares, over
+        // all trials and over the trials that reach a target
+        // layers_[2 l] and layers_[2 l + 1] receive, over the trials that reach a target,
+        // the weighted number of tilted edges of layer l that fired and that were rolled
+        // (the cross-entropy update of q_[l] is their ratio), layers_ holds 2 n values
+        int nthreads = threads > 0 ? threads : omp_get_max_threads();
+        int n = g->n;
+        int used_threads = 1;
+        double w_sum = 0, w_sq = 0, hit_sum = 0, hit_sq = 0;
+        Workspace **workspaces = new Workspace *[nthreads]();
+        double **sums = new double *[nthreads]();
+        double **layer_sums = new double *[nthreads]();
+
+        // hops to the nearest target (over incoming edges)
+        int *to_target = new int[n];
+        int *queue = new int[n];
+
+        hop_distances(g->rindptr, g->rindices, n, targets_, n_targets_, to_target, queue);
+
+        delete[] queue;
+
+        // one layer per finite distance to the targets
+        int n_layers = 0;
+
+        for (int j = 0; j < n; j++)
+            if (to_target[j] != INT_MAX && to_target[j] + 1 > n_layers)
+                n_layers = to_target[j] + 1;
+
+        // log likelihood ratio of one tilted edge of each layer, by outcome
+        double *log_live = new double[n_layers + 1];
+        double *log_dead = new double[n_layers + 1];
+
+        for (int l = 0; l < n_layers; l++)
+        {
+            log_live[l] = log((double)p_) - log((double)q_[l]);
+            log_dead[l] = log(1.0 - (double)p_) - log(1.0 - (double)q_[l]);
+        }
+
+#pragma omp parallel num_threads(nthreads) reduction(+ : w_sum, w_sq, hit_sum, hit_sq)
+        {
+            Workspace *ws = new Workspace(n);
+            double *s = new double[n]();
+            double *ls = new double[2 * n_layers + 1]();
+            int *live_count = new int[n_layers + 1];
+            int *rolled_count = new int[n_layers + 1];
+            workspaces[omp_get_thread_num()] = ws;
+            sums[omp_get_thread_num()] = s;
+            layer_sums[omp_get_thread_num()] = ls;
+
+#pragma omp single
+            used_threads = omp_get_num_threads();
+
+#pragma omp for schedule(dynamic, 4)
+            for (int i = 0; i < iters_; i++)
+            {
+                RandomGenerator gen(seed_, i);
+
+                ws->next_trial();
+
+                unsigned int epoch = ws->epoch;
+                int *q = ws->queue;
+                int qhead = 0, qtail = 0;
+                double log_w = 0;
+
+                for (int l = 0; l < n_layers; l++)
+                    live_count[l] = rolled_count[l] = 0;
+
+                for (int j = 0; j < len_ss_; j++)
+                    if (ws->stamp[ss_[j]] != epoch)
+                    {
+                        ws->stamp[ss_[j]] = epoch;
+                        q[qtail++] = ss_[j];
+                    }
+
+                while (qhead < qtail)
+                {
+                    int node = q[qhead++];
+
+                    for (int e = g->indptr[node]; e < g->indptr[node + 1]; e++)
+                    {
+                        int nei = g->indices[e];
+
+                        if (ws->stamp[nei] == epoch)
+                            continue;
+
+                        bool toward = to_target[nei] != INT_MAX && to_target[nei] + 1 == to_target[node];
+                        bool live = gen.get() < (toward ? q_[to_target[node]] : p_);
+
+                        if (toward)
+                        {
+                            int l = to_target[node];
+
+                            log_w += live ? log_live[l] : log_dead[l];
+                            live_count[l] += live;
+                            rolled_count[l]++;
+                        }
+
+                        if (live)
+                        {
+                            ws->stamp[nei] = epoch;
+                            q[qtail++] = nei;
+                        }
+                    }
+                }
+
+                double w = exp(log_w);
+
+                for (int j = 0; j < qtail; j++)
+                    s[q[j]] += w;
+
+                w_sum += w;
+                w_sq += w * w;
+
+                for (int t = 0; t < n_targets_; t++)
+                    if (ws->stamp[targets_[t]] == epoch)
+                    {
+                        hit_sum += w;
+                        hit_sq += w * w;
+
+                        for (int l = 0; l < n_layers; l++)
+                        {
+                            ls[2 * l] += w * live_count[l];
+                            ls[2 * l + 1] += w * rolled_count[l];
+                        }
+
+                        break;
+                    }
+            }
+
+            delete[] live_count;
+            delete[] rolled_count;
+        }
+
+#pragma omp parallel for num_threads(nthreads)
+        for (int j = 0; j < n; j++)
+        {
+            double total = 0;
+
+            for (int t = 0; t < used_threads; t++)
+                total += sums[t][j];
+
+            result_[j] = (float)(total / iters_);
+        }
+
+        weights_[0] = w_sum;
+        weights_[1] = w_sq;
+        weights_[2] = hit_sum;
+        weights_[3] = hit_sq;
+
+        for (int j = 0; j < 2 * n; j++)
+            layers_[j] = 0;
+
+        for (int t = 0; t < used_threads; t++)
+            for (int j = 0; j < 2 * n_layers; j++)
+                layers_[j] += layer_sums[t][j];
+
+        for (int t = 0; t < used_threads; t++)
+        {
+            delete workspaces[t];
+            delete[] sums[t];
+            delete[] layer_sums[t];
+        }
+
+        delete[] workspaces;
+        delete[] sums;
+        delete[] layer_sums;
+        delete[] to_target;
+        delete[] log_live;
+        delete[] log_dead;
+    }
+
+    void graph_estimate_multi_p(Graph *g, int threads, int n_p_, float *p_vals_, int iters_, int len_ss_, int *ss_, uint64_t seed_, float *result_)
+    {
+        // access probabilities at several p at once, result_ is n_p_ x n
+        // p_vals_ has to be ascending
+        // every world fixes one threshold per edge and the edge is live at p iff its
+        // threshold is below p, so the worlds of all p are nested in each other
+        // a node's level is the first p at which it is reached: the cascade runs
+        // level by level, and an edge that is still dead at the current level is
+        // parked on the level where it turns live
+        int nthreads = threads > 0 ? threads : omp_get_max_threads();
+        int n = g->n;
+        int used_threads = 1;
+        bool symmetric = !g->directed;
+        int **level_counts = new int *[nthreads]();
+
+#pragma omp parallel num_threads(nthreads)
+        {
+            Workspace *ws = new Workspace(n);
+            int *counts = new int[(long long)n_p_ * n]();
+            std::vector<int> *pending = new std::vector<int>[n_p_];
+            level_counts[omp_get_thread_num()] = counts;
+
+#pragma omp single
+            used_threads = omp_get_num_threads();
+
+#pragma omp for schedule(dynamic, 4)
+            for (int r = 0; r < iters_; r++)
+            {
+                uint64_t world_key = mix64(seed_, r);
+
+                ws->next_trial();
+
+                unsigned int epoch = ws->epoch;
+
+                for (int i = 0; i < len_ss_; i++)
+                    pending[0].push_back(ss_[i]);
+
+                for (int l = 0; l < n_p_; l++)
+                {
+                    // grows while it is walked, nodes reached at this level go to its end
+                    std::vector<int> &current = pending[l];
+
+                    for (size_t i = 0; i < current.size(); i++)
+                    {
+                        int node = current[i];
+
+                        if (ws->stamp[node] == epoch)
+                            continue;
+
+                        ws->stamp[node] = epoch;
+                        counts[(long long)l * n + node]++;
+
+                        for (int e = g->indptr[node]; e < g->indptr[node + 1]; e++)
+                        {
+                            int nei = g->indices[e];
+
+                            if (ws->stamp[nei] == epoch)
+                                continue;
+
+                            // first level at which the edge is live, binary search from l on
+                            float t = edge_threshold(world_key, node, nei, symmetric);
+                            int j = l, hi = n_p_;
+
+                            while (j < hi)
+                            {
+                                int mid = (j + hi) / 2;
+
+                                if (t >= p_vals_[mid])
+                                    j = mid + 1;
+                                else
+                                    hi = mid;
+                            }
+
+                            if (j < n_p_)
+                                pending[j].push_back(nei);
+                        }
+                    }
+
+                    current.clear();
+                }
+            }
+
+            delete ws;
+            delete[] pending;
+        }
+
+        // a node reached at level l is reached at every p from p_vals_[l] on
+#pragma omp parallel for num_threads(nthreads)
+        for (int j = 0; j < n; j++)
+        {
+            int total = 0;
+
+            for (int l = 0; l < n_p_; l++)
+            {
+                for (int t = 0; t < used_threads; t++)
+                    total += level_counts[t][(long long)l * n + j];
+
+                result_[(long long)l * n + j] = (float)total / iters_;
+            }
+        }
+
+        for (int t = 0; t < used_threads; t++)
+            delete[] level_counts[t];
+
+        delete[] level_counts;
+    }
+
+    void graph_percolation_sweeps(Graph *g, int threads, int sweeps_, uint64_t seed_, double *result_)
+    {
+        // Newman-Ziff bond percolation on an undirected graph
+        // every sweep adds the edges one by one in a random order, merging clusters with
+        // union-find, and result_[k] (k = 0 .. number of edges) receives the mean over
+        // sweeps of sum(cluster size^2) / n^2 after k edges: the expected fraction of
+        // nodes in the cluster of a uniformly random node
+        int nthreads = threads > 0 ? threads : omp_get_max_threads();
+        int n = g->n;
+        int used_threads = 1;
+
+        // every undirected edge is stored twice, keep it once
+        int m = 0;
+        for (int u = 0; u < n; u++)
+            for (int e = g->indptr[u]; e < g->indptr[u + 1]; e++)
+                m += u < g->indices[e];
+
+        int *eu = new int[m];
+        int *ev = new int[m];
+
+        for (int u = 0, i = 0; u < n; u++)
+            for (int e = g->indptr[u]; e < g->indptr[u + 1]; e++)
+                if (u < g->indices[e])
+                {
+                    eu[i] = u;
+                    ev[i] = g->indices[e];
+                    i++;
+                }
+
+        double **sums = new double *[nthreads]();
+
+#pragma omp parallel num_threads(nthreads)
+        {
+            double *s = new double[m + 1]();
+            int *parent = new int[n];
+            int *size = new int[n];
+            int *order = new int[m];
+            sums[omp_get_thread_num()] = s;
+
+#pragma omp single
+            used_threads = omp_get_num_threads();
+
+#pragma omp for schedule(dynamic, 1)
+            for (int r = 0; r < sweeps_; r++)
+            {
+                RandomGenerator gen(seed_, r);
+
+                // random edge order (Fisher-Yates)
+                for (int i = 0; i < m; i++)
+                    order[i] = i;
+
+                for (int i = m - 1; i > 0; i--)
+                {
+                    int j = (int)(((uint64_t)gen.next() * (uint64_t)(i + 1)) >> 32);
+                    int t = order[i];
+                    order[i] = order[j];
+                    order[j] = t;
+                }
+
+                for (int i = 0; i < n; i++)
+                {
+                    parent[i] = i;
+                    size[i] = 1;
+                }
+
+                // sum of squared cluster sizes, n singletons to start with
+                double squares = n;
+                s[0] += squares;
+
+                for (int k = 0; k < m; k++)
+                {
+                    int ru = find_root(parent, eu[order[k]]);
+                    int rv = find_root(parent, ev[order[k]]);
+
+                    if (ru != rv)
+                    {
+                        // union by size
+                        if (size[ru] < size[rv])
+                        {
+                            int t = ru;
+                            ru = rv;
+                            rv = t;
+                        }
+
+                        squares += 2.0 * size[ru] * size[rv];
+                        parent[rv] = ru;
+                        size[ru] += size[rv];
+                    }
+
+                    s[k + 1] += squares;
+                }
+            }
+
+            delete[] parent;
+            delete[] size;
+            delete[] order;
+        }
+
+        for (int k = 0; k <= m; k++)
+        {
+            double total = 0;
+
+            for (int t = 0; t < used_threads; t++)
+                total += sums[t][k];
+
+            result_[k] = total / sweeps_ / ((double)n * n);
+        }
+
+        for (int t = 0; t < used_threads; t++)
+            delete[] sums[t];
+
+        delete[] sums;
+        delete[] eu;
+        delete[] ev;
+    }
+
+    void graph_world_labels(Graph *g, int threads, float p_, int worlds_, uint64_t seed_, int *labels_)
+    {
+        // samples worlds_ live-edge worlds of an undirected graph and writes their
+        // component labels into labels_, a worlds_ x n row-major array
+        int nthreads = threads > 0 ? threads : omp_get_max_threads();
+
+#pragma omp parallel num_threads(nthreads)
+        {
+            int *parent = new int[g->n];
+            int *relabel = new int[g->n];
+
+#pragma omp for schedule(dynamic, 1)
+            for (int r = 0; r < worlds_; r++)
+                label_world(g, mix64(seed_, r), p_, parent, relabel, labels_ + (long long)r * g->n);
+
+            delete[] parent;
+            delete[] relabel;
+        }
+    }
+
+    Worlds *worlds_create(Graph *g, float p_, int count_, uint64_t seed_)
+    {
+        Worlds *w = new Worlds;
+
+        w->g = g;
+        w->p = p_;
+        w->count = count_;
+        w->seed = seed_;
+        w->words = (g->n + 63) / 64;
+        w->reached = new uint64_t[(long long)count_ * w->words]();
+        w->counts = new int[g->n]();
+
+        return w;
+    }
+
+    void worlds_free(Worlds *w)
+    {
+        delete[] w->reached;
+        delete[] w->counts;
+        delete w;
+    }
+
+    void worlds_add_seed(Worlds *w, int threads, int seed_node_)
+    {
+        // expands every world from the new seed and updates the per-node counts
+        int nthreads = threads > 0 ? threads : omp_get_max_threads();
+        int n = w->g->n;
+
+#pragma omp parallel num_threads(nthreads)
+        {
+            int *queue = new int[n];
+
+#pragma omp for schedule(dynamic, 4)
+            for (int r = 0; r < w->count; r++)
+            {
+                int added = expand_world(w->g, mix64(w->seed, r), w->p, seed_node_, w->reached + (long long)r * w->words, queue);
+
+                for (int i = 0; i < added; i++)
+                {
+#pragma omp atomic
+                    w->counts[queue[i]]++;
+                }
+            }
+
+            delete[] queue;
+        }
+    }
+
+    void graph_greedy_scores(Graph *g, int threads, float p_, int worlds_, int len_ss_, int *ss_, int n_cand_, int *candidates_, uint64_t seed_, float *result_)
+    {
+        // result_[i] is the minimum access probability for the seeds plus candidates_[i],
+        // with every candidate scored over the same worlds_ live-edge worlds
+        // the reach of the seeds is stored node-major: bit r of row v is set iff v is
+        // reached in world r, so a node's count is the popcount of its row
+        // a candidate's reach in a world is the seeds' reach OR'd with what the candidate
+        // adds, and only that delta is ever simulated
+        int nthreads = threads > 0 ? threads : omp_get_max_threads();
+        int n = g->n;
+        int words = (worlds_ + 63) / 64;
+        uint64_t *base = new uint64_t[(long long)n * words]();
+        int *base_count = new int[n];
+
+#pragma omp parallel num_threads(nthreads)
+        {
+            uint64_t *reached = new uint64_t[(n + 63) / 64];
+            int *queue = new int[n];
+
+            // a block of 64 worlds per iteration, so no two threads write the same word
+#pragma omp for schedule(dynamic, 1)
+            for (int b = 0; b < words; b++)
+            {
+                int end = (b + 1) * 64 < worlds_ ? (b + 1) * 64 : worlds_;
+
+                for (int r = b * 64; r < end; r++)
+                {
+                    for (int i = 0; i < (n + 63) / 64; i++)
+                        reached[i] = 0;
+
+                    for (int i = 0; i < len_ss_; i++)
+                    {
+                        int added = expand_world(g, mix64(seed_, r), p_, ss_[i], reached, queue);
+
+                        for (int j = 0; j < added; j++)
+                            base[(long long)queue[j] * words + b] |= 1ULL << (r & 63);
+                    }
+                }
+            }
+
+            delete[] reached;
+            delete[] queue;
+
+#pragma omp for
+            for (int v = 0; v < n; v++)
+            {
+                int count = 0;
+
+                for (int i = 0; i < words; i++)
+                    count += __builtin_popcountll(base[(long long)v * words + i]);
+
+                base_count[v] = count;
+            }
+        }
+
+        bool symmetric = !g->directed;
+
+#pragma omp parallel num_threads(nthreads)
+        {
+            Workspace *ws = new Workspace(n); // counts holds the delta of the current candidate
+            int *touched = new int[n];
+
+#pragma omp for schedule(dynamic, 1)
+            for (int i = 0; i < n_cand_; i++)
+            {
+                int c = candidates_[i];
+                int n_touched = 0;
+
+                for (int r = 0; r < worlds_; r++)
+                {
+                    uint64_t bit = 1ULL << (r & 63);
+                    int word = r >> 6;
+
+                    // the candidate adds nothing where the seeds already reach it
+                    if (base[(long long)c * words + word] & bit)
+                        continue;
+
+                    ws->next_trial();
+
+                    unsigned int epoch = ws->epoch;
+                    int *q = ws->queue;
+                    int head = 0, tail = 0;
+                    uint64_t world_key = mix64(seed_, r);
+
+                    ws->stamp[c] = epoch;
+                    q[tail++] = c;
+
+                    while (head < tail)
+                    {
+                        int node = q[head++];
+
+                        if (ws->counts[node]++ == 0)
+                            touched[n_touched++] = node;
+
+                        for (int e = g->indptr[node]; e < g->indptr[node + 1]; e++)
+                        {
+                            int nei = g->indices[e];
+
+                            // stop at nodes the seeds reach in this world, their delta is empty
+                            if (ws->stamp[nei] != epoch && !(base[(long long)nei * words + word] & bit) && edge_threshold(world_key, node, nei, symmetric) < p_)
+                            {
+                                ws->stamp[nei] = epoch;
+                                q[tail++] = nei;
+                            }
+                        }
+                    }
+                }
+
+                // the delta is disjoint from the seeds' reach, so the counts just add up
+                int min_count = INT_MAX;
+
+                for (int v = 0; v < n; v++)
+                {
+                    int count = base_count[v] + ws->counts[v];
+                    min_count = count < min_count ? count : min_count;
+                }
+
+                result_[i] = (float)min_count / worlds_;
+
+                for (int j = 0; j < n_touched; j++)
+                    ws->counts[touched[j]] = 0;
+            }
+
+            delete ws;
+            delete[] touched;
+        }
+
+        delete[] base;
+        delete[] base_count;
+    }
+
+    void worlds_estimate(Worlds *w, float *result_)
+    {
+        // fraction of worlds in which each node is reached by the seeds added so far
+        for (int i = 0; i < w->g->n; i++)
+            result_[i] = (float)w->counts[i] / w->count;
+    }
+}
@@ -2,14 +2,16 @@ import numpy as np
 import matplotlib.pyplot as plt
 import experiments as exp
 import algorithms as alg
+import world_index as wi
 import time
+import os
 
 class Experiment:
     '''
     Runs an experiment on a given graph G, with a given algorithm, for given parameters
     '''
 
-    def __init__(self, G, initial_seeds = [], k=100, p=0.5, ic_trials=1000, iterations=20, use_cache=False, algorithm=None, name=None, perform_eval=True, threads=0):
+    def __init__(self, G, initial_seeds = [], k=100, p=0.5, ic_trials=1000, iterations=20, use_cache=False, algorithm=None, name=None, perform_eval=True, threads=0, evaluation_index=None, prediction_index=None, world_seed=None):
         self.G = G
         self.initial_seeds = initial_seeds
         self.p = p
@@ -25,6 +27,10 @@ class Experiment:
         self.delta_time = None
         self.threads = threads
         self.precompute_total_time = 0
+        # world indices for scoring and for predicting, sampled apart (see run_specified_experiments)
+        self.evaluation_index = evaluation_index
+        self.prediction_index = prediction_index
+        self.world_seed = world_seed # shared live-edge worlds for evaluation, see run_specified_experiments
 
     def run(self):
         '''
@@ -41,9 +47,15 @@ class Experiment:
 
             algo = self.algorithm(
                 self.G, k=self.k, seeds=[self.initial_seeds[i]], p=self.p, ic_trials=self.ic_trials, use_cache=self.use_cache, threads=self.threads)
+            algo.world_index = self.prediction_index
+            algo.evaluation_index = self.evaluation_index
             
             if self.perform_eval:
-                evaluations.append(algo.evaluate())
+                if self.world_seed is not None:
+                    # score the seed prefixes against the shared worlds
+                    evaluations.append(algo.evaluate(incremental=True, world_seed=self.world_seed))
+                else:
+                    evaluations.append(algo.evaluate())
                 print(f"[{self.name}] Evaluation: {evaluations[-1]}")
                 self.precompute_total_time += algo.precompute_time
             else:
@@ -59,9 +71,23 @@ class Experiment:
         
         return evaluations
     
-def run_specified_experiments(G, k, p, iterations, use_cache=False, algo_dict=None, draw_fig=False, save_evals=False, p_tag=None):
+def run_specified_experiments(G, k, p, iterations, use_cache=False, algo_dict=None, draw_fig=False, save_evals=False, p_tag=None, use_world_index=False, common_worlds=False):
     evaluations = {}
 
+    if common_worlds and use_world_index:
+        # the world index already scores every algorithm on the same worlds, the seed would go unused
+        raise Exception("common_worlds and use_world_index can't be combined")
+
+    # one set of sampled worlds scores every algorithm on this (G, p), and the algorithms
+    # that simulate pick their seeds on a second, independent one; picking and scoring
+    # on the same worlds would favour them over the structural algorithms
+    evaluation_index = wi.get_world_index(G, p) if use_world_index else None
+    prediction_index = wi.get_world_index(G, p, cache_dir='./cache/world_index/prediction/') if use_world_index else None
+
+    # common random numbers: every algorithm is evaluated on the same worlds,
+    # so differences between algorithms are not drowned in simulation noise
+    world_seed = int(np.random.randint(0, np.iinfo(np.int64).max, dtype=np.int64)) if common_worlds else None
+
     if p_tag == None:
         p_tag = str(p).replace('.', '')
 
@@ -80,7 +106,7 @@ def run_specified_experiments(G, k, p, iterations, use_cache=False, algo_dict=No
             print(f'Running {key}')
 
             # initialize specified experimental environments and evaluate
-            experiment = Experiment(G=G, k=k, initial_seeds=initial_seeds, p=p, iterations=iterations, use_cache=use_cache, algorithm=alg.get_algorithm(key), name=key)
+            experiment = Experiment(G=G, k=k, initial_seeds=initial_seeds, p=p, iterations=iterations, use_cache=use_cache, algorithm=alg.get_algorithm(key), name=key, evaluation_index=evaluation_index, prediction_index=prediction_index, world_seed=world_seed)
             evaluations[key] = experiment.run()
 
             if draw_fig:
@@ -105,6 +131,13 @@ def run_specified_experiments(G, k, p, iterations, use_cache=False, algo_dict=No
         # save evaluations
         np.save(f'./cache/evaluations/{G.name}_{p_tag}_{round(p, 3)}.npy', evaluations)
 
+        if world_seed is not None:
+            # kept out of the evaluations dict, whose keys are read as algorithm names
+            os.makedirs('./cache/evaluation_seeds/', exist_ok=True)
+
+            with open(f'./cache/evaluation_seeds/{G.name}_{p_tag}_{round(p, 3)}.txt', 'w') as f:
+                f.write(str(world_seed))
+
     return evaluations
 
 def run_timing_experiment(G, algo_dict, p, p_tag, iterations=10, k=1):
@@ -1,46 +1,722 @@
 import independent_cascade as ic
-from multiprocessing import Pool
+import shared_pool as sp
 import numpy as np
 import networkx as nx
 import ctypes
+import weakref
+import itertools
+from statistics import NormalDist
 
-def estimate(G, p, seeds, ic_trials, threads=0):
-    # prepare cpp arguments
+# graphs with at most this many nodes still go through the dense adjacency matrix path
+DENSE_MAX_NODES = 64
 
-    # Convert the graph to an adjacency matrix (1D array)
-    A = nx.to_numpy_array(G, dtype=np.int32).flatten()
+# edge sampling modes of the native engine, see ic_csr in cpp/prob_est.cpp
+SAMPLING = {'bernoulli': 0, 'geometric': 1}
+
+# native engines: one trial at a time, or 64 trials per machine word
+ENGINES = {'scalar': 0, 'bitwise': 1}
+
+# per-trial values averaged by the scalar engine: activation indicators, or the
+# Rao-Blackwellized 1 - (1 - p)^(active in-neighbours), see Estimator in cpp/prob_est.cpp
+ESTIMATORS = {'indicator': 0, 'rao_blackwell': 1}
+
+# below this p, estimate() skips to successful edges with geometric gaps by default
+GEOMETRIC_MAX_P = 0.15
+
+# the native library, loaded on first use
+_prob_est_cpp = None
+
+def _int_ptr(a):
+    return a.ctypes.data_as(ctypes.POINTER(ctypes.c_int))
+
+def _float_ptr(a):
+    return a.ctypes.data_as(ctypes.POINTER(ctypes.c_float))
+
+def _resolve_seed(seed):
+    # without an explicit seed, draw one from numpy's global state,
+    # so np.random.seed() also makes the native estimates reproducible
+    if seed is None:
+        seed = np.random.randint(0, np.iinfo(np.int64).max, dtype=np.int64)
+
+    return ctypes.c_uint64(int(seed) & 0xFFFFFFFFFFFFFFFF)
+
+def _resolve_sampling(sampling, p):
+    # with few successful edges, geometric skipping needs far fewer random numbers
+    if sampling is None:
+        sampling = 'geometric' if p <= GEOMETRIC_MAX_P else 'bernoulli'
+
+    return SAMPLING[sampling]
+
+def to_csr(G):
+    '''
+    Converts G to CSR arrays (indptr, indices), both int32.
+    Node i is the i-th node of G.nodes(), its neighbours are indices[indptr[i]:indptr[i+1]].
+    '''
     n = G.number_of_nodes()
+    index = {node: i for i, node in enumerate(G.nodes())}
+
+    # row pointers from node degrees (out-degrees for directed graphs)
+    indptr = np.zeros(n + 1, dtype=np.int32)
+    indptr[1:] = np.cumsum(np.fromiter(map(len, G.adj.values()), dtype=np.int64, count=n))
+
+    # flattened neighbour lists, the label lookup is skipped when nodes are already 0..n-1 in order
+    neighbors = itertools.chain.from_iterable(G.adj.values())
+    if not all(i == node for node, i in index.items()):
+        neighbors = map(index.__getitem__, neighbors)
+
+    indices = np.fromiter(neighbors, dtype=np.int32, count=indptr[-1])
+
+    return indptr, indices
+
+def load_library():
+    '''
+    Loads the native ProbEst library once and declares its signatures.
+    '''
+    global _prob_est_cpp
+
+    if _prob_est_cpp is None:
+        lib = ctypes.CDLL('./cpp/prob_est')
+
+        int_ptr = ctypes.POINTER(ctypes.c_int)
+        float_ptr = ctypes.POINTER(ctypes.c_float)
+
+        lib.graph_create.restype = ctypes.c_void_p
+        lib.graph_create.argtypes = [ctypes.c_int, int_ptr, int_ptr, ctypes.c_int]
+        lib.graph_free.restype = None
+        lib.graph_free.argtypes = [ctypes.c_void_p]
+        lib.graph_estimate.restype = None
+        lib.graph_estimate.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.c_float, ctypes.c_int, ctypes.c_int, int_ptr, ctypes.c_uint64, ctypes.c_int, ctypes.c_int, ctypes.c_int, float_ptr]
+        lib.graph_estimate_many.restype = None
+        lib.graph_estimate_many.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.c_float, ctypes.c_int, ctypes.c_int, int_ptr, int_ptr, ctypes.c_uint64, ctypes.c_int, ctypes.c_int, float_ptr]
+        lib.graph_estimate_targets.restype = None
+        lib.graph_estimate_targets.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.c_float, ctypes.c_int, ctypes.c_int, int_ptr, ctypes.c_int, int_ptr, ctypes.c_uint64, float_ptr]
+        lib.graph_estimate_reverse.restype = None
+        lib.graph_estimate_reverse.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.c_float, ctypes.c_int, ctypes.c_int, int_ptr, ctypes.c_int, ctypes.c_uint64, float_ptr]
+        lib.graph_greedy_scores.restype = None
+        lib.graph_greedy_scores.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.c_float, ctypes.c_int, ctypes.c_int, int_ptr, ctypes.c_int, int_ptr, ctypes.c_uint64, float_ptr]
+        lib.graph_estimate_importance.restype = None
+        lib.graph_estimate_importance.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.c_float, float_ptr, ctypes.c_int, ctypes.c_int, int_ptr, ctypes.c_int, int_ptr, ctypes.c_uint64, float_ptr, ctypes.POINTER(ctypes.c_double), ctypes.POINTER(ctypes.c_double)]
+        lib.graph_estimate_multi_p.restype = None
+        lib.graph_estimate_multi_p.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.c_int, float_ptr, ctypes.c_int, ctypes.c_int, int_ptr, ctypes.c_uint64, float_ptr]
+        lib.graph_percolation_sweeps.restype = None
+        lib.graph_percolation_sweeps.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.c_int, ctypes.c_uint64, ctypes.POINTER(ctypes.c_double)]
+        lib.graph_world_labels.restype = None
+        lib.graph_world_labels.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.c_float, ctypes.c_int, ctypes.c_uint64, int_ptr]
+
+        lib.estimate.restype = None
+        lib.estimate.argtypes = [ctypes.c_int, ctypes.c_float, ctypes.c_int, ctypes.c_int, ctypes.c_int, int_ptr, int_ptr, ctypes.c_uint64, float_ptr]
+
+        lib.worlds_create.restype = ctypes.c_void_p
+        lib.worlds_create.argtypes = [ctypes.c_void_p, ctypes.c_float, ctypes.c_int, ctypes.c_uint64]
+        lib.worlds_free.restype = None
+        lib.worlds_free.argtypes = [ctypes.c_void_p]
+        lib.worlds_add_seed.restype = None
+        lib.worlds_add_seed.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.c_int]
+        lib.worlds_estimate.restype = None
+        lib.worlds_estimate.argtypes = [ctypes.c_void_p, float_ptr]
+
+        _prob_est_cpp = lib
+
+    return _prob_est_cpp
+
+class CompiledGraph:
+    '''
+    A graph converted to CSR and uploaded to the native library once,
+    so that repeated estimate calls on the same graph skip the conversion.
+    The native copy is freed together with this object.
+    '''
+
+    def __init__(self, G):
+        self.n = G.number_of_nodes()
+        self.m = G.number_of_edges()
+        self.directed = G.is_directed()
+        self.indptr, self.indices = to_csr(G)
+
+        self.lib = load_library()
+        self.handle = self.lib.graph_create(self.n, _int_ptr(self.indptr), _int_ptr(self.indices), int(self.directed))
+
+    def __del__(self):
+        if getattr(self, 'handle', None):
+            self.lib.graph_free(self.handle)
+            self.handle = None
+
+    def dense_adjacency(self):
+        '''
+        Flat n x n int32 adjacency matrix for the dense path, built from the CSR arrays on first use.
+        '''
+        if getattr(self, 'dense', None) is None:
+            src = np.repeat(np.arange(self.n), np.diff(self.indptr))
+            self.dense = np.zeros(self.n * self.n, dtype=np.int32)
+            self.dense[src * self.n + self.indices] = 1
+
+        return self.dense
+
+    def matches(self, G):
+        '''
+        Cheap check that G was not resized since it was compiled.
+        '''
+        return self.n == G.number_of_nodes() and self.m == G.number_of_edges()
+
+    def estimate(self, seeds, p, trials, threads=0, seed=None, sampling=None, engine='scalar', estimator='indicator'):
+        '''
+        Estimates access probabilities of every node for the seed set.
+        Runs with the same seed produce the same estimates.
+        sampling is 'bernoulli' or 'geometric', picked from p when None (scalar engine only).
+        engine 'bitwise' simulates 64 trials per machine word.
+        estimator 'rao_blackwell' has lower variance but is biased upwards (scalar engine only).
+        '''
+        if engine == 'bitwise' and (estimator != 'indicator' or sampling is not None):
+            raise Exception("The bitwise engine has no estimator or sampling options")
+
+        ss = np.array(seeds, dtype=np.int32)
+        result = np.zeros(self.n, dtype=np.float32) # for storing the results of the cpp program
+
+        self.lib.graph_estimate(self.handle, threads, p, trials, len(ss), _int_ptr(ss), _resolve_seed(seed), _resolve_sampling(sampling, p), ENGINES[engine], ESTIMATORS[estimator], _float_ptr(result))
+
+        return result
+
+    def estimate_many(self, seed_sets, p, trials, threads=0, seed=None, sampling=None, min_only=False):
+        '''
+        Estimates several seed sets in one native call.
+        Returns an (n_sets x n) array, or only the minimum of each row with min_only.
+        '''
+        # ragged seed sets as one flat array plus offsets
+        offsets = np.zeros(len(seed_sets) + 1, dtype=np.int32)
+        offsets[1:] = np.cumsum([len(s) for s in seed_sets])
+        flat = np.zeros(max(offsets[-1], 1), dtype=np.int32)
+        flat[:offsets[-1]] = [s for seeds in seed_sets for s in seeds]
+
+        shape = len(seed_sets) if min_only else (len(seed_sets), self.n)
+        result = np.zeros(shape, dtype=np.float32)
+
+        self.lib.graph_estimate_many(self.handle, threads, p, trials, len(seed_sets), _int_ptr(offsets), _int_ptr(flat), _resolve_seed(seed), _resolve_sampling(sampling, p), int(min_only), _float_ptr(result))
+
+        return result
+
+    def estimate_targets(self, seeds, targets, p, trials, threads=0, seed=None):
+        '''
+        Estimates access probabilities of the target nodes only, by walking
+        back from each target to the seeds. Returns one value per target.
+        '''
+        ss = np.array(seeds, dtype=np.int32)
+        ts = np.array(targets, dtype=np.int32)
+        result = np.zeros(len(ts), dtype=np.float32)
+
+        self.lib.graph_estimate_targets(self.handle, threads, p, trials, len(ss), _int_ptr(ss), len(ts), _int_ptr(ts), _resolve_seed(seed), _float_ptr(result))
+
+        return result
+
+    def estimate_reverse(self, seeds, target, p, trials, threads=0, seed=None):
+        '''
+        For every node c, estimates the probability that target is reached
+        from the seeds plus c. One reverse simulation covers all n candidates.
+        '''
+        ss = np.array(seeds, dtype=np.int32)
+        result = np.zeros(self.n, dtype=np.float32)
+
+        self.lib.graph_estimate_reverse(self.handle, threads, p, trials, len(ss), _int_ptr(ss), int(target), _resolve_seed(seed), _float_ptr(result))
+
+        return result
+
+    def greedy_scores(self, seeds, candidates, p, worlds, threads=0, seed=None):
+        '''
+        Minimum access probability of the seeds plus each candidate, with all
+        candidates scored over the same sampled live-edge worlds.
+        '''
+        ss = np.array(seeds, dtype=np.int32)
+        cs = np.array(candidates, dtype=np.int32)
+        result = np.zeros(len(cs), dtype=np.float32)
+
+        self.lib.graph_greedy_scores(self.handle, threads, p, worlds, len(ss), _int_ptr(ss), len(cs), _int_ptr(cs), _resolve_seed(seed), _float_ptr(result))
+
+        return result
+
+    def estimate_importance(self, seeds, targets, p, trials, q, threads=0, seed=None):
+        '''
+        Importance-sampled access probabilities: edges that lead closer to the
+        targets fire with probability q, trials are reweighted by likelihood ratio.
+        q is one value, or one per layer (hop distance of the edge's source to the targets).
+        Returns the estimates, the effective number of trials reaching a target, and
+        the cross-entropy update of the per-layer q (None if no trial reached a target).
+        '''
+        ss = np.array(seeds, dtype=np.int32)
+        ts = np.array(targets, dtype=np.int32)
+        result = np.zeros(self.n, dtype=np.float32)
+        weights = np.zeros(4, dtype=np.float64)
+        layers = np.zeros((self.n, 2), dtype=np.float64)
+
+        # layers past the given ones keep the last value
+        q = np.atleast_1d(np.asarray(q, dtype=np.float32))
+        qs = np.full(self.n, q[-1], dtype=np.float32)
+        qs[:min(len(q), self.n)] = q[:self.n]
+
+        self.lib.graph_estimate_importance(self.handle, threads, p, _float_ptr(qs), trials, len(ss), _int_ptr(ss), len(ts), _int_ptr(ts), _resolve_seed(seed), _float_ptr(result), weights.ctypes.data_as(ctypes.POINTER(ctypes.c_double)), layers.ctypes.data_as(ctypes.POINTER(ctypes.c_double)))
+
+        # Kish's effective sample size (sum w)^2 / sum w^2 of the trials reaching a target;
+        # without tilt this is the number of hits, the relative error is about 1 / sqrt(ess)
+        ess = weights[2] ** 2 / weights[3] if weights[3] > 0 else 0.0
+
+        # per layer, the fraction of the tilted edges that fired in the trials reaching a target,
+        # reweighted to p; layers without a rolled edge keep their q
+        rolled = layers[:, 1] > 0
+        q_next = None
+
+        if np.any(rolled):
+            q_next = qs.astype(np.float64)
+            q_next[rolled] = layers[rolled, 0] / layers[rolled, 1]
+
+        return result, ess, q_next
+
+    def estimate_multi_p(self, seeds, p_vals, trials, threads=0, seed=None):
+        '''
+        Access probabilities at every p in p_vals from one sample of edge
+        thresholds, the worlds for different p are coupled (nested).
+        Returns a (len(p_vals) x n) array, rows in the order of p_vals.
+        '''
+        ss = np.array(seeds, dtype=np.int32)
+
+        # the native side walks the p values in ascending order
+        order = np.argsort(p_vals, kind='stable')
+        ps = np.array(p_vals, dtype=np.float32)[order]
+        result = np.zeros((len(ps), self.n), dtype=np.float32)
+
+        self.lib.graph_estimate_multi_p(self.handle, threads, len(ps), _float_ptr(ps), trials, len(ss), _int_ptr(ss), _resolve_seed(seed), _float_ptr(result))
+
+        out = np.empty_like(result)
+        out[order] = result
+
+        return out
+
+    def percolation(self, sweeps, threads=0, seed=None):
+        '''
+        Newman-Ziff bond percolation sweeps over an undirected graph.
+        Returns, for every number k of occupied edges, the expected fraction
+        of nodes in the cluster of a random node (mean over sweeps).
+        '''
+        if self.directed:
+            raise Exception("Percolation sweeps need an undirected graph")
+
+        # each undirected edge once
+        edges = np.sum(self.indices > np.repeat(np.arange(self.n), np.diff(self.indptr)))
+        result = np.zeros(edges + 1, dtype=np.float64)
+
+        self.lib.graph_percolation_sweeps(self.handle, threads, sweeps, _resolve_seed(seed), result.ctypes.data_as(ctypes.POINTER(ctypes.c_double)))
+
+        return result
+
+    def world_labels(self, p, worlds, seed=None, out=None, threads=0):
+        '''
+        Samples live-edge worlds of an undirected graph and returns the
+        (worlds x n) int32 array of per-world connected component labels.
+        out can be a preallocated array, e.g. a memory-mapped file.
+        '''
+        if self.directed:
+            raise Exception("World labels need an undirected graph")
+
+        if out is None:
+            out = np.empty((worlds, self.n), dtype=np.int32)
+
+        self.lib.graph_world_labels(self.handle, threads, p, worlds, _resolve_seed(seed), _int_ptr(out))
+
+        return out
+
+class Worlds:
+    '''
+    A fixed sample of live-edge worlds that seeds are added to one at a time.
+    Each added seed only expands into the nodes it newly reaches in each world,
+    so the estimates for all prefixes of a seed list cost about one simulation.
+    The same seed gives the same worlds.
+    '''
+
+    def __init__(self, G, p, trials, seed=None, threads=0):
+        self.cg = compile_graph(G) # keeps the native graph alive as long as the worlds
+        self.threads = threads
+        self.handle = self.cg.lib.worlds_create(self.cg.handle, p, trials, _resolve_seed(seed))
+
+    def __del__(self):
+        if getattr(self, 'handle', None):
+            self.cg.lib.worlds_free(self.handle)
+            self.handle = None
+
+    def add_seed(self, s):
+        self.cg.lib.worlds_add_seed(self.handle, self.threads, int(s))
+
+    def add_seeds(self, seeds):
+        for s in seeds:
+            self.add_seed(s)
+
+    def estimate(self):
+        '''
+        Access probabilities for all seeds added so far.
+        '''
+        result = np.zeros(self.cg.n, dtype=np.float32)
+        self.cg.lib.worlds_estimate(self.handle, _float_ptr(result))
+
+        return result
 
-    prob_est_cpp = ctypes.CDLL('./cpp/prob_est')
+# compiled graphs are cached per graph object and dropped along with the graph
+_compiled_graphs = weakref.WeakKeyDictionary()
 
-    result = np.zeros(n, dtype=np.float32) # for storing the results of the cpp program
+def compile_graph(G):
+    '''
+    Returns the CompiledGraph for G, building it on first use.
+    '''
+    cg = _compiled_graphs.get(G)
 
-    # prepare array pointers
-    A_ptr = A.ctypes.data_as(ctypes.POINTER(ctypes.c_int))
-    ss_ptr = np.array(seeds, dtype=np.int32).ctypes.data_as(ctypes.POINTER(ctypes.c_int))
-    result_ptr = result.ctypes.data_as(ctypes.POINTER(ctypes.c_float))
+    if cg is None or not cg.matches(G):
+        cg = CompiledGraph(G)
+        _compiled_graphs[G] = cg
 
-    # Call the C++ function with the 2D array
-    prob_est_cpp.estimate(ctypes.c_int(threads), ctypes.c_float(p), ctypes.c_int(n), ctypes.c_int(ic_trials), ctypes.c_int(len(seeds)), A_ptr, ss_ptr, result_ptr)
+    return cg
+
+def native_available():
+    '''
+    Whether the native library is built and loads on this host.
+    '''
+    try:
+        load_library()
+    except OSError:
+        return False
+
+    return True
+
+# CSR arrays for the NumPy engine, per graph object like compiled graphs
+_csr_graphs = weakref.WeakKeyDictionary()
+
+def cached_csr(G):
+    '''
+    to_csr(G), converted once per graph and reused until its size changes.
+    '''
+    size, indptr, indices = _csr_graphs.get(G, (None, None, None))
+
+    if size != (G.number_of_nodes(), G.number_of_edges()):
+        indptr, indices = to_csr(G)
+        _csr_graphs[G] = ((G.number_of_nodes(), G.number_of_edges()), indptr, indices)
+
+    return indptr, indices
+
+def estimate_numpy(G, p, seeds, ic_trials, seed=None, batch_cells=1 << 24):
+    '''
+    Pure NumPy IC engine for hosts without the native library.
+    All trials of a batch advance together, one BFS level at a time: the
+    frontier is a list of (trial, node) pairs, every edge out of it gets one
+    vectorized random roll, and the newly reached pairs are the next frontier.
+    batch_cells bounds the size of the (trials x n) activation matrix.
+    '''
+    indptr, indices = cached_csr(G)
+    n = len(indptr) - 1
+    rng = np.random.default_rng(_resolve_seed(seed).value)
+    ss = np.unique(np.array(seeds, dtype=np.int64))
+
+    counts = np.zeros(n, dtype=np.int64)
+    batch = max(1, min(ic_trials, batch_cells // max(n, 1)))
+
+    for start in range(0, ic_trials, batch):
+        size = min(batch, ic_trials - start)
+
+        # flat (trials x n) activation matrix, cell = trial * n + node
+        activated = np.zeros(size * n, dtype=bool)
+        owner = np.empty(size * n, dtype=np.int32) # scratch space for removing duplicates
+
+        trial = np.repeat(np.arange(size), len(ss))
+        node = np.tile(ss, size)
+        activated[trial * n + node] = True
+
+        while len(node) > 0:
+            degree = indptr[node + 1] - indptr[node]
+            total = degree.sum()
+
+            if total == 0:
+                break
+
+            # every edge out of the frontier: row start of its node plus its offset in the row
+            offsets = np.arange(total) - np.repeat(np.cumsum(degree) - degree, degree)
+            target = indices[np.repeat(indptr[node], degree) + offsets]
+            cell = np.repeat(trial, degree) * n + target
+
+            # roll every edge once, keep the live ones into nodes not reached yet
+            cell = cell[(rng.random(total, dtype=np.float32) < p) & ~activated[cell]]
+
+            # a node reached over several edges enters the frontier once:
+            # scatter each edge's position, keep the one that was written last
+            order = np.arange(len(cell), dtype=np.int32)
+            owner[cell] = order
+            cell = cell[owner[cell] == order]
+            activated[cell] = True
+
+            trial, node = cell // n, cell % n
+
+        counts += activated.reshape(size, n).sum(axis=0)
+
+    return (counts / ic_trials).astype(np.float32)
+
+def estimate(G, p, seeds, ic_trials, threads=0, seed=None, sampling=None, engine='scalar', estimator='indicator'):
+    '''
+    Access probabilities of every node for the seed set.
+    estimator 'rao_blackwell' averages, for every non-seed node, the chance that
+    one of its active in-neighbours' edges fires instead of the 0/1 outcome.
+    That is the conditional expectation given the cascade of the graph without
+    the node, and equals it whenever the node ends up inactive. When the node is
+    active, neighbours it activated itself are counted too, so the estimate is
+    biased upwards, mostly for nodes with a high access probability; it needs
+    the native library.
+    '''
+    if not native_available():
+        # no native library on this host, sampling and engine only pick how the native trials run
+        if estimator != 'indicator':
+            raise Exception("The {} estimator needs the native library".format(estimator))
+
+        return estimate_numpy(G, p, seeds, ic_trials, seed)
+
+    if G.number_of_nodes() <= DENSE_MAX_NODES and sampling is None and engine == 'scalar' and estimator == 'indicator':
+        # tiny synthetic graphs with every option at its default, the dense matrix is cheap here
+        return estimate_dense(G, p, seeds, ic_trials, threads, seed)
+
+    # the CSR conversion and upload happen once per graph
+    return compile_graph(G).estimate(seeds, p, ic_trials, threads, seed, sampling, engine, estimator)
+
+def _wilson(probs, trials, z):
+    # Wilson score interval for binomial proportions
+    scale = 1 + z ** 2 / trials
+    center = (probs + z ** 2 / (2 * trials)) / scale
+    half_width = z / scale * np.sqrt(probs * (1 - probs) / trials + z ** 2 / (4 * trials ** 2))
+
+    return center - half_width, center + half_width
+
+def estimate_adaptive(G, p, seeds, epsilon=0.1, delta=0.05, target='all', batch=100, max_trials=1000, threads=0, seed=None, sampling=None):
+    '''
+    Runs trials in batches until the estimate is good enough, or max_trials is reached.
+    epsilon is relative, access probabilities in fairness terms are often far below
+    any useful absolute tolerance.
+    target 'all': every node's access probability is within a factor 1 +- epsilon of the truth.
+    target 'argmin': the lowest estimated node is the true argmin (its interval is
+    below every other node's), or within a factor 1 + epsilon of the true minimum.
+    Both hold with probability at least 1 - delta, using Wilson intervals with a
+    union bound over the batches (and over the nodes where it is needed).
+    Nodes without a single hit can't be bounded relatively, so those runs go to max_trials.
+    Returns the probabilities and the number of trials used.
+    '''
+    cg = compile_graph(G)
+
+    # every batch gets its own stream of a common base seed
+    base_seed = _resolve_seed(seed).value
+
+    looks = -(-max_trials // batch)
+    normal = NormalDist()
+
+    if target == 'all':
+        # every node has to be covered, on both sides
+        z = normal.inv_cdf(1 - delta / (2 * cg.n * looks))
+    elif target == 'argmin':
+        # the lower bound only has to cover the true argmin (a single fixed node),
+        # the upper bound has to cover whichever node ends up chosen
+        z_lower = normal.inv_cdf(1 - delta / (2 * looks))
+        z_upper = normal.inv_cdf(1 - delta / (2 * cg.n * looks))
+    else:
+        raise Exception("Unknown adaptive target")
+
+    hits = np.zeros(cg.n, dtype=np.float64)
+    trials = 0
+
+    while trials < max_trials:
+        size = min(batch, max_trials - trials)
+        hits += cg.estimate(seeds, p, size, threads, base_seed + trials, sampling).astype(np.float64) * size
+        trials += size
+
+        probs = hits / trials
+
+        if target == 'all':
+            lower, upper = _wilson(probs, trials, z)
+            done = np.all(upper - lower <= 2 * epsilon * probs)
+        else:
+            # the true minimum is at least min(lower), the chosen node's value at most its upper bound
+            lower, _ = _wilson(probs, trials, z_lower)
+            _, upper = _wilson(probs, trials, z_upper)
+            choice = np.argmin(probs)
+
+            # if the true argmin is another node, its lower bound is below the chosen node's upper bound
+            others = np.delete(lower, choice)
+            separated = len(others) == 0 or upper[choice] < np.min(others)
+
+            done = separated or upper[choice] <= (1 + epsilon) * np.min(lower)
+
+        if done:
+            break
+
+    return (hits / trials).astype(np.float32), trials
+
+def argmin_multi_fidelity(G, p, seeds, screen_trials=50, candidates=64, max_trials=1000, z=3.0, threads=0, seed=None):
+    '''
+    Finds the node with the lowest access probability without estimating
+    every node precisely. All nodes are ranked with screen_trials forward
+    trials, doubled while fewer than half of the candidates are strictly
+    below the cut (e.g. most nodes at 0). Further ties at the cut are broken
+    randomly. The lowest
+    candidates are then raced: every level doubles the trials and drops the
+    nodes whose Wilson interval (z standard errors) is above the best upper
+    bound. Stops with one candidate left or max_trials per candidate.
+    Returns the node index and the (trials, candidates) of every level.
+    '''
+    cg = compile_graph(G)
+    base_seed = _resolve_seed(seed).value
+
+    hits = cg.estimate(seeds, p, screen_trials, threads, base_seed).astype(np.float64) * screen_trials
+    trials = screen_trials
+    levels = [(trials, cg.n)]
+
+    m = min(candidates, cg.n)
+
+    while True:
+        probs = hits / trials
+        cut = np.partition(probs, m - 1)[m - 1]
+
+        # the screen ranks the candidates once at least half of them are strictly below the cut,
+        # estimates are counts so a few nodes tie at the cut almost always
+        if np.sum(probs < cut) >= m // 2 or np.sum(probs <= cut) == m or trials >= max_trials:
+            break
+
+        size = min(trials, max_trials - trials)
+        hits += cg.estimate(seeds, p, size, threads, base_seed + len(levels)).astype(np.float64) * size
+        trials += size
+        levels.append((trials, cg.n))
+
+    # everything below the cut, filled up with a random choice of the nodes at the cut
+    below = np.where(probs < cut)[0]
+    at_cut = np.where(probs == cut)[0]
+    alive = np.concatenate((below, np.random.choice(at_cut, m - len(below), replace=False)))
+
+    hits = np.zeros(m, dtype=np.float64)
+    trials = 0
+    size = screen_trials
+
+    while len(alive) > 1 and trials < max_trials:
+        size = min(size * 2, max_trials - trials)
+        hits += cg.estimate_targets(seeds, alive, p, size, threads, base_seed + len(levels)).astype(np.float64) * size
+        trials += size
+        levels.append((trials, len(alive)))
+
+        est = hits / trials
+        lower, upper = _wilson(est, trials, z)
+
+        # racing: drop only what is clearly above the best node
+        keep = lower <= np.min(upper)
+        alive = alive[keep]
+        hits = hits[keep]
+
+    # choose a random node among the lowest estimates, like Myopic
+    est = hits / trials if trials > 0 else probs[alive]
+    ties = alive[est == np.min(est)]
+
+    return int(np.random.choice(ties)), levels
+
+def estimate_multi_p(G, p_vals, seeds, ic_trials, threads=0, seed=None):
+    '''
+    Access probabilities for several p in one pass, as a (len(p_vals) x n) array.
+    Every edge draws one uniform threshold per trial and is live at p iff the
+    threshold is below p, so all p share the same random numbers.
+    '''
+    if not native_available():
+        # no coupling without the native library, one NumPy run per p
+        return np.array([estimate_numpy(G, p, seeds, ic_trials, seed) for p in p_vals])
+
+    return compile_graph(G).estimate_multi_p(seeds, p_vals, ic_trials, threads, seed)
+
+def estimate_importance(G, p, seeds, targets, ic_trials, q=None, threads=0, seed=None, pilot_trials=None, pilot_levels=10):
+    '''
+    Importance-sampled access probabilities for tiny probabilities of the targets.
+    Edges that lead one hop closer to the nearest target fire with probability q
+    (at least p), and each trial is weighted by the likelihood ratio of the edges
+    it rolled, so the estimates stay unbiased for every node.
+    Without a q, a cross-entropy pilot picks one for every layer of the shortest
+    paths to these targets, since a layer with many parallel edges needs much less
+    tilt than a narrow one. Starting at p, each pilot run of pilot_trials
+    (ic_trials by default) moves every layer's q most of the way to the reweighted
+    fraction of its tilted edges that fired in the trials reaching a target; a
+    pilot without any such trial tilts every layer halfway to 1.
+    Returns the estimates and the effective number of trials reaching a target;
+    the relative error is about 1 / sqrt(ess), so a small ESS (a few trials
+    dominate) means the estimate can't be trusted.
+    '''
+    cg = compile_graph(G)
+    base_seed = _resolve_seed(seed).value
+
+    if q is None:
+        pilot_trials = pilot_trials or ic_trials
+        q = np.full(cg.n, p)
+
+        for level in range(pilot_levels):
+            _, _, q_next = cg.estimate_importance(seeds, targets, p, pilot_trials, q, threads, base_seed + 1 + level)
+
+            if q_next is None:
+                # too rare to see at this tilt yet
+                q = q + (1 - q) / 2
+                continue
+
+            # a tilt of 1 would make dead tilted edges impossible; smoothing keeps
+            # one lucky pilot trial from setting the tilt on its own
+            q_next = 0.7 * np.clip(q_next, p, 0.99) + 0.3 * q
+            converged = np.max(np.abs(q_next - q)) < 0.01
+            q = q_next
+
+            if converged:
+                break
+
+    result, ess, _ = cg.estimate_importance(seeds, targets, p, ic_trials, np.maximum(q, p), threads, base_seed)
+
+    return result, ess
+
+def estimate_many(G, p, seed_sets, trials, threads=0, seed=None, sampling=None, min_only=False):
+    '''
+    Batched estimate: one native call for a list of seed sets.
+    Returns an (n_sets x n) array, or the per-set minimum with min_only.
+    '''
+    if not native_available():
+        # one NumPy run per set, each on its own stream of the seed
+        base_seed = _resolve_seed(seed).value
+        result = np.array([estimate_numpy(G, p, seeds, trials, base_seed + i) for i, seeds in enumerate(seed_sets)])
+
+        return result.min(axis=1) if min_only else result
+
+    return compile_graph(G).estimate_many(seed_sets, p, trials, threads, seed, sampling, min_only)
+
+def estimate_dense(G, p, seeds, ic_trials, threads=0, seed=None):
+    # the adjacency matrix (1D array) is built once per graph, next to its CSR arrays
+    cg = compile_graph(G)
+    A = cg.dense_adjacency()
+
+    result = np.zeros(cg.n, dtype=np.float32) # for storing the results of the cpp program
+    ss = np.array(seeds, dtype=np.int32)
+
+    cg.lib.estimate(threads, p, cg.n, ic_trials, len(ss), _int_ptr(A), _int_ptr(ss), _resolve_seed(seed), _float_ptr(result))
 
     return result
 
 # LEGACY CODE FROM BEFORE THE CPP REWRITE
 
-def estimate_legacy(G, p, seeds, ic_trials):
-    # initialize a cascade object
-    cascade = ic.IndependentCascade(G=G, p=p, seeds=seeds)
+# worker pools are kept per graph object, like compiled graphs
+_pools = weakref.WeakKeyDictionary()
 
-    # prepare arguments for multiprocessing
-    # randint rolls between 0 and 2147483647 here according to np docs
-    args = zip([cascade for _ in range(ic_trials)], np.random.randint(
-        0, np.iinfo(np.int32(10)).max, ic_trials))
+def get_pool(G, processes=None):
+    '''
+    Returns the persistent CascadePool for G, starting it on first use.
+    The workers receive the graph once through shared memory.
+    '''
+    # (n, m) at start time, to notice a resized graph like CompiledGraph.matches
+    size, pool = _pools.get(G, (None, None))
 
-    # run trials in parallel
-    results = np.array(Pool().starmap(ic.IndependentCascade.run, args))
+    if pool is None or size != (G.number_of_nodes(), G.number_of_edges()):
+        if pool is not None:
+            pool.close()
 
-    # sum over columns and return
-    return np.mean(results, axis=0, dtype=np.float64)
+        pool = sp.CascadePool(*to_csr(G), processes=processes)
+        _pools[G] = ((G.number_of_nodes(), G.number_of_edges()), pool)
+
+    return pool
+
+def estimate_legacy(G, p, seeds, ic_trials):
+    # pure Python trials on a persistent worker pool,
+    # tasks only carry the seeds and the random states
+    return get_pool(G).estimate(seeds, p, ic_trials)
 
 def estimate_single_thread(G, p, seeds, ic_trials):
     # this version of estimate runs on a single thread
@@ -0,0 +1,109 @@
+import numpy as np
+import weakref
+from collections import deque  # efficient queue implementation
+from multiprocessing import Pool, shared_memory
+
+# per-worker views of the shared CSR arrays, set by _init_worker
+_worker_blocks = []
+_worker_indptr = None
+_worker_indices = None
+
+
+def _init_worker(indptr_name, indices_name, n, m):
+    '''
+    Attaches a worker to the shared CSR arrays once, when the pool starts.
+    '''
+    global _worker_indptr, _worker_indices
+
+    indptr_block = shared_memory.SharedMemory(name=indptr_name)
+    indices_block = shared_memory.SharedMemory(name=indices_name)
+
+    # the blocks have to stay referenced for as long as the arrays are used
+    _worker_blocks.extend([indptr_block, indices_block])
+
+    _worker_indptr = np.ndarray(n + 1, dtype=np.int32, buffer=indptr_block.buf)
+    _worker_indices = np.ndarray(m, dtype=np.int32, buffer=indices_block.buf)
+
+
+def _run_trials(seeds, p, random_states):
+    '''
+    Runs one IC trial per random state on the shared graph and returns the
+    number of trials each node was activated in.
+    Same simulation as IndependentCascade.run, neighbours in the same order.
+    '''
+    n = len(_worker_indptr) - 1
+    counts = np.zeros(n)
+
+    for random_state in random_states:
+        rng = np.random.default_rng(random_state)
+
+        activated = np.zeros(n)  # initialize a vector of activated nodes
+
+        # insert seeds into the queue
+        q = deque(seeds)
+        activated[seeds] = 1
+
+        while q:
+            node = q.popleft()
+            neighbors = _worker_indices[_worker_indptr[node]:_worker_indptr[node + 1]]
+
+            roll_vector = rng.random(len(neighbors))
+            new_activated = neighbors[np.logical_and(roll_vector < p, activated[neighbors] == 0)]
+
+            q.extend(new_activated)
+            activated[new_activated] = 1
+
+        counts += activated
+
+    return counts
+
+
+def _release(pool, blocks):
+    # stops the workers and frees the shared memory, runs at most once
+    pool.terminate()
+
+    for block in blocks:
+        block.close()
+        block.unlink()
+
+
+class CascadePool:
+    '''
+    A persistent pool of worker processes for the pure Python IC simulation.
+    The graph is copied into shared memory as CSR arrays once, when the pool
+    is created; tasks only carry seed sets and RNG seeds.
+    '''
+
+    def __init__(self, indptr, indices, processes=None):
+        self.n = len(indptr) - 1
+        self.m = len(indices)
+
+        # zero-sized shared memory blocks are not allowed
+        self.blocks = [shared_memory.SharedMemory(create=True, size=max(a.nbytes, 1)) for a in (indptr, indices)]
+
+        for block, a in zip(self.blocks, (indptr, indices)):
+            np.ndarray(a.shape, dtype=np.int32, buffer=block.buf)[:] = a
+
+        self.pool = Pool(processes, initializer=_init_worker, initargs=(self.blocks[0].name, self.blocks[1].name, self.n, self.m))
+        self.processes = self.pool._processes
+
+        self._finalizer = weakref.finalize(self, _release, self.pool, self.blocks)
+
+    def close(self):
+        self._finalizer()
+
+    def tasks(self, seeds, p, trials, chunks_per_process=4):
+        # splits the trials into a few chunks per worker, each with its own random states
+        # randint rolls between 0 and 2147483647 here according to np docs
+        random_states = np.random.randint(0, np.iinfo(np.int32(10)).max, trials)
+        chunks = np.array_split(random_states, min(trials, self.processes * chunks_per_process))
+
+        return [(list(seeds), p, chunk) for chunk in chunks if len(chunk) > 0]
+
+    def estimate(self, seeds, p, trials):
+        '''
+        Access probabilities of every node for the seed set.
+        '''
+        counts = self.pool.starmap(_run_trials, self.tasks(seeds, p, trials))
+
+        return np.sum(counts, axis=0) / trials
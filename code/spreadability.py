@@ -1,6 +1,101 @@
 import probability as prob
 import numpy as np
 import networks
+from scipy import stats
+from scipy import sparse
+from scipy.sparse import csgraph
+
+def _binomial_mix(sizes, p):
+    # expectation of sizes[k] for k ~ Binomial(m, p), over the k with non-negligible mass
+    m = len(sizes) - 1
+    spread = 10 * np.sqrt(m * p * (1 - p)) + 10
+    lo = max(0, int(m * p - spread))
+    hi = min(m, int(m * p + spread))
+    k = np.arange(lo, hi + 1)
+
+    return np.dot(stats.binom.pmf(k, m, p), sizes[lo:hi + 1])
+
+def _curve_numpy(G, p_vals, num_seeds, worlds, seed):
+    # curve() for hosts without the native library, one sample per p
+    indptr, indices = prob.cached_csr(G)
+    n = len(indptr) - 1
+    rng = np.random.default_rng(np.random.randint(0, np.iinfo(np.int32).max) if seed is None else seed)
+
+    result = np.zeros(len(p_vals))
+
+    if not G.is_directed():
+        # every edge once, as its u < v copy in the CSR arrays
+        src = np.repeat(np.arange(n), np.diff(indptr))
+        once = src < indices
+        src, dst = src[once], indices[once]
+
+        # mean squared cluster size of a few sampled live-edge worlds per p
+        for i, p in enumerate(p_vals):
+            for _ in range(worlds):
+                live = rng.random(len(src)) < p
+                world = sparse.csr_array((np.ones(live.sum()), (src[live], dst[live])), shape=(n, n))
+                _, labels = csgraph.connected_components(world, directed=False)
+
+                result[i] += np.sum(np.bincount(labels) ** 2) / n ** 2
+
+        return result / worlds
+
+    # directed graphs: one NumPy cascade per random seed and p
+    seeds = rng.choice(n, size=num_seeds, replace=True)
+
+    for i, p in enumerate(p_vals):
+        for s in seeds:
+            result[i] += np.sum(prob.estimate_numpy(G, p, [s], 1, seed=rng.integers(np.iinfo(np.int64).max)))
+
+    return result / num_seeds / n
+
+def curve(G, p_vals, num_seeds=1000, sweeps=20, seed=None):
+    '''
+    Spreadability (expected fraction of nodes activated from one random seed) at every p in p_vals.
+    Undirected graphs: the cascade of a seed is its cluster in the live-edge world, so the
+    curve is the mean squared cluster size of bond percolation. A few Newman-Ziff sweeps give
+    it for every number of live edges, and each p mixes those over the binomial edge count.
+    Directed graphs: one coupled world per random seed covers every p at once.
+    Without the native library, each p is sampled on its own with NumPy, sweeps
+    worlds per p for undirected graphs.
+    '''
+    if not prob.native_available():
+        return _curve_numpy(G, p_vals, num_seeds, sweeps, seed)
+
+    cg = prob.compile_graph(G)
+
+    if not cg.directed:
+        sizes = cg.percolation(sweeps, seed=seed)
+
+        return np.array([_binomial_mix(sizes, p) for p in p_vals])
+
+    # sample seeds at random
+    seeds = np.random.choice(G.nodes, size=num_seeds, replace=True)
+
+    num_activated = np.zeros(len(p_vals))
+
+    for s in seeds:
+        test = cg.estimate_multi_p([s], p_vals, 1)
+
+        num_activated += np.sum(test, axis=1)
+
+    return num_activated / len(seeds) / G.number_of_nodes()
+
+def inverse(G, targets, resolution=0.001, num_seeds=1000, sweeps=20, seed=None):
+    '''
+    The p at which the spreadability reaches each of the targets (e.g. [0.2, 0.5, 0.8]),
+    interpolated on a grid of p with the given resolution.
+    Directed graphs are sampled per seed and p level, their grid is at most 0.01 fine.
+    '''
+    if G.is_directed():
+        resolution = max(resolution, 0.01)
+
+    p_grid = np.arange(resolution, 1, resolution)
+
+    # sampled curves of directed graphs can wiggle, interpolation needs them non-decreasing
+    spreadability = np.maximum.accumulate(curve(G, p_grid, num_seeds, sweeps, seed))
+
+    return np.interp(targets, spreadability, p_grid)
 
 def search(G, num_seeds):
     '''
@@ -13,21 +108,10 @@ def search(G, num_seeds):
 
     p_vals_dict = {}
 
-    # sample seeds at random
-    seeds = np.random.choice(G.nodes, size=num_seeds, replace=True)
-
-    spreadability = []
     p_vals = list(np.arange(0.01, 1, 0.01))
 
-    for p in p_vals:
-        num_activated = []
-
-        for s in seeds:
-            test = prob.estimate(G, p, [s], 1)
-
-            num_activated.append(np.sum(test))
-        
-        spreadability.append(np.mean(num_activated) / G.number_of_nodes())
+    # the whole curve at once, num_seeds only matters for directed graphs
+    spreadability = list(curve(G, p_vals, num_seeds))
 
     # linearly search the values of p for the desired spreadabilities
 
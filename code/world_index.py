@@ -0,0 +1,92 @@
+import probability as prob
+import numpy as np
+import os
+
+# For undirected IC with a uniform p, the nodes activated by a seed set are exactly
+# the bond percolation clusters (components of the live-edge world) containing a seed.
+# A world index samples the worlds once per (graph, p) and keeps only their component
+# labels, after which any seed set is evaluated without simulating a single cascade.
+
+# worlds are marked in chunks of this many to bound temporary memory
+CHUNK = 128
+
+class WorldIndex:
+    '''
+    Component labels of sampled live-edge worlds of one graph for one p.
+    labels is a (worlds x n) int32 array, possibly a read-only memory map.
+    '''
+
+    def __init__(self, labels, p):
+        self.labels = labels
+        self.p = p
+        self.worlds, self.n = labels.shape
+
+    def estimate(self, seeds):
+        '''
+        Access probability of every node for the seed set, same as prob.estimate.
+        '''
+        seeds = np.asarray(seeds, dtype=np.int64)
+        counts = np.zeros(self.n, dtype=np.int64)
+
+        for start in range(0, self.worlds, CHUNK):
+            block = np.asarray(self.labels[start:start + CHUNK])
+
+            # shift labels so every world in the chunk has its own label range
+            offsets = (np.arange(block.shape[0], dtype=np.int64) * self.n)[:, None]
+
+            # mark the components of the seeds, a node is active iff its component is marked
+            marked = np.zeros(block.size, dtype=bool)
+            marked[(block[:, seeds] + offsets).ravel()] = True
+
+            counts += marked[block + offsets].sum(axis=0)
+
+        return (counts / self.worlds).astype(np.float32)
+
+def build(G, p, worlds=1000, seed=None, path=None, threads=0):
+    '''
+    Samples the worlds for G and p.
+    With a path, the labels are written to a .npy file and memory-mapped.
+    '''
+    cg = prob.compile_graph(G)
+
+    if path is None:
+        return WorldIndex(cg.world_labels(p, worlds, seed, threads=threads), p)
+
+    # write to a temporary file first so other processes never see a partial index
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    labels = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.int32, shape=(worlds, cg.n))
+    cg.world_labels(p, worlds, seed, out=labels, threads=threads)
+    labels.flush()
+    del labels
+
+    os.replace(tmp_path, path)
+
+    return load(path, p)
+
+def load(path, p):
+    '''
+    Opens a persisted index read-only, it can be shared by several processes.
+    '''
+    return WorldIndex(np.load(path, mmap_mode='r'), p)
+
+def get_world_index(G, p, worlds=1000, seed=None, cache_dir='./cache/world_index/'):
+    '''
+    Returns the cached index for (G, p), building and persisting it if needed.
+    A cached index is only reused if its shape matches G.
+    '''
+    if G.is_directed():
+        raise Exception("World indices are only valid for undirected graphs")
+
+    # unnamed graphs all share the name '', so the edge count is part of the key as well
+    path = '{}{}_{}_{}_{}.npy'.format(cache_dir, G.name, G.number_of_edges(), round(p, 3), worlds)
+
+    if os.path.exists(path):
+        index = load(path, p)
+
+        # a different graph under the same key, rebuild it
+        if index.labels.shape == (worlds, G.number_of_nodes()):
+            return index
+
+    os.makedirs(cache_dir, exist_ok=True)
+
+    return build(G, p, worlds, seed, path)